@@ -3,24 +3,38 @@ import openai
 import datetime
 import asyncio
 from dotenv import load_dotenv
-from prompts import SYSTEM_PROMPT, JOURNAL_PROMPT
+from prompts import SYSTEM_PROMPT, TOOLS_SYSTEM_PROMPT, JOURNAL_PROMPT
 from llama_index.core import VectorStoreIndex, Document, Settings
 from typing import Dict, List, Tuple
 import os
 import json
 from google.auth.exceptions import RefreshError
 import re
-from calendar_utils import (
-    CACHE_FILE,
-    create_calendar_index,
-    fetch_and_filter_calendar_events,
-)
+from calendar_utils import calendar_index_manager
 from llama_index.embeddings.ollama import OllamaEmbedding
 from langfuse.decorators import observe
 from langfuse.openai import AsyncOpenAI
 from llama_index.core import VectorStoreIndex, SimpleDirectoryReader
 
-from journal_functions import get_top_news, journal_search, calendar_search
+from journal_functions import (
+    TOOLS,
+    get_top_news,
+    journal_search,
+    calendar_search,
+    start_journal_indexer,
+)
+from journal_index import schedule_update
+from journal_edits import EditError
+from journal_store import get_journal_store
+from entry_cache import read_entry, read_entry_with_revision
+from journal_log import RevisionConflict
+from journal_update import (
+    EDIT_MIN_CHARS,
+    build_edit_prompt,
+    build_journal_prompt,
+    edit_journal_entry,
+    stream_journal_update,
+)
 
 # Load environment variables
 load_dotenv()
@@ -30,6 +44,12 @@ function_names = ["get_top_news", "journal_search", "calendar_search"]
 # Configuration
 USE_OLLAMA = os.getenv("OLLAMA") == "1"
 
+# Native tool calling; switched off for a session if the model rejects tools
+TOOL_CALLING = os.getenv("TOOL_CALLING", "1") == "1"
+
+# Rounds of tool calls the model may chain before it has to answer
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", "3"))
+
 if USE_OLLAMA:
     config = {
         "endpoint_url": os.getenv(
@@ -46,6 +66,12 @@ else:
 
 print(f"AI Provider: {'Ollama' if USE_OLLAMA else 'OpenAI'}")
 
+# Keep the journal search index fresh in the background
+start_journal_indexer()
+
+# Fold logged entry edits into the .md files in the background
+get_journal_store().start_compactor()
+
 # Initialize services
 if USE_OLLAMA:
     client = AsyncOpenAI(
@@ -56,16 +82,6 @@ else:
     client = AsyncOpenAI(api_key=config["api_key"])
 
 
-# Helper functions
-async def load_cache():
-    try:
-        with open(CACHE_FILE, "r") as f:
-            cache = json.load(f)
-        return cache["events"]
-    except (FileNotFoundError, json.JSONDecodeError, KeyError):
-        return None
-
-
 # Add this new function to handle re-authentication
 async def handle_reauth():
     token_path = "token.json"
@@ -79,7 +95,9 @@ async def handle_reauth():
 
     # Attempt to fetch calendar events to trigger the authentication flow
     try:
-        await fetch_and_filter_calendar_events()
+        # Raises if the index couldn't be rebuilt with the new credentials; a
+        # sync from moments ago mustn't stand in for reaching Google
+        await calendar_index_manager.refresh(force_refresh=True, bypass_rate_limit=True)
         await cl.Message(
             content="Re-authentication successful. You can now use calendar features."
         ).send()
@@ -95,8 +113,8 @@ async def on_chat_start():
     welcome_message = "Hi there! I'm here to help you with your journal entries."
     await cl.Message(content=welcome_message).send()
 
-    # Create calendar index and fetch today's events
-    calendar_index, todays_events = await create_calendar_index()
+    # Get the shared calendar index and today's events
+    calendar_index, todays_events = await calendar_index_manager.get()
     if calendar_index is None:
         await cl.Message(
             content="I'm having trouble accessing your calendar. You may need to re-authenticate."
@@ -113,8 +131,6 @@ async def on_chat_start():
             content=f"I've successfully loaded {total_events} events from your calendar. You have {today_event_count} event(s) scheduled for today."
         ).send()
 
-    cl.user_session.set("calendar_index", calendar_index)
-
     events_summary = f"Today's events: {len(todays_events)}"
     message_history = [
         {"role": "system", "content": SYSTEM_PROMPT},
@@ -144,23 +160,71 @@ def extract_json_from_response(text):
         return None
 
 
-@observe
-async def print_response(response_text):
-    if not isinstance(response_text, str):
-        response_text = str(response_text)  # Ensure it's a string
+def may_be_function_call(text):
+    """Whether a partially streamed response could still be a function call JSON."""
+    stripped = text.lstrip()
+    return any(
+        stripped.startswith(prefix) or prefix.startswith(stripped)
+        for prefix in ("{", "```json", "```{", "```\n{")
+    )
 
-    tokens = re.split(r"(\s+)", response_text)  # Splitting while keeping whitespace
 
-    response_message = cl.Message(content="")
-    await response_message.send()
+@observe
+async def stream_response(message_history, use_tools=False):
+    """Stream a completion into a chat message as the provider sends tokens.
+
+    Without native tools, a response that starts like a function call JSON is
+    held back rather than shown. Returns the full text, the message it was
+    streamed into (None if held back or empty) and any native tool calls.
+    """
+    tools_kwargs = {"tools": TOOLS} if use_tools else {}
+    stream = await client.chat.completions.create(
+        model=config["model"],
+        messages=message_history,
+        temperature=0.3,
+        max_tokens=500,
+        stream=True,
+        **tools_kwargs,
+    )
+
+    response_text = ""
+    response_message = None
+    tool_calls = {}
+    async for chunk in stream:
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+
+        # Tool call names and arguments arrive in fragments, keyed by index
+        for tool_call_delta in delta.tool_calls or []:
+            tool_call = tool_calls.setdefault(
+                tool_call_delta.index, {"id": None, "name": "", "arguments": ""}
+            )
+            if tool_call_delta.id:
+                tool_call["id"] = tool_call_delta.id
+            if tool_call_delta.function:
+                tool_call["name"] += tool_call_delta.function.name or ""
+                tool_call["arguments"] += tool_call_delta.function.arguments or ""
+
+        token = delta.content or ""
+        if not token:
+            continue
+        response_text += token
+
+        if response_message is None:
+            if not use_tools and may_be_function_call(response_text):
+                continue
+            # Clearly not a function call: flush what was held back so far
+            response_message = cl.Message(content="")
+            await response_message.send()
+            token = response_text
 
-    for token in tokens:
         await response_message.stream_token(token)
-        await asyncio.sleep(0.02)  # Delay of x seconds between each token
 
-    await response_message.update()
+    if response_message is not None:
+        await response_message.update()
 
-    return response_message
+    return response_text, response_message, [tool_calls[i] for i in sorted(tool_calls)]
 
 
 @observe
@@ -168,8 +232,11 @@ async def call_function(function_json):
     if function_json["function_name"] == "get_top_news":
         response = await get_top_news()
     elif function_json["function_name"] == "journal_search":
-        journal_response = await journal_search(function_json["params"]["query"])
-        response = str(journal_response.response)
+        params = function_json["params"]
+        journal_response = await journal_search(
+            params["query"], params.get("start_date"), params.get("end_date")
+        )
+        response = str(getattr(journal_response, "response", journal_response))
     elif function_json["function_name"] == "calendar_search":
         calendar_response = await calendar_search(function_json["params"]["query"])
         response = calendar_response  # Remove str() conversion
@@ -185,55 +252,215 @@ def generate_unique_filename():
     return f"{today}-{timestamp}-entry.md"
 
 
-async def update_journal_file(filename: str, new_content: str):
-    file_path = os.path.join("data", filename)
+@observe
+async def update_journal_file(filename: str, user_input: str, conversation_context=""):
+    """Update the entry from the user's input with a single completion.
+
+    Long entries are updated with section-addressed edits, falling back to a
+    full rewrite if the edits don't apply. Rewrites are streamed: the chat
+    shows progress and, in the copilot, the editor follows the entry as it is
+    written. Returns the updated entry, or None if it was left as is.
+    """
+    # Reads may wait on the journal store's locks, so they run in a thread
+    existing_entry, revision = await asyncio.to_thread(
+        read_entry_with_revision, filename
+    )
 
-    # Read existing content
-    with open(file_path, "r") as f:
-        existing_content = f.read().strip()
+    status_message = cl.Message(content=f"Updating journal entry '{filename}'...")
+    await status_message.send()
 
-    # Prepare the prompt for the LLM
-    prompt = JOURNAL_PROMPT.format(
-        existing_entry=existing_content, user_content=new_content
-    )
+    async def on_progress(text, done):
+        if cl.context.session.client_type != "copilot":
+            return
+        # Partial updates carry the text; the final one makes the editor reload
+        args = (
+            {"filename": filename} if done else {"filename": filename, "content": text}
+        )
+        await cl.CopilotFunction(name="update_journal", args=args).acall()
+
+    try:
+        updated_entry = None
+        if len(existing_entry) >= EDIT_MIN_CHARS:
+            prompt = build_edit_prompt(existing_entry, user_input, conversation_context)
+            try:
+                updated_entry = await edit_journal_entry(
+                    client, config["model"], filename, prompt, base_revision=revision
+                )
+                await on_progress(updated_entry, True)
+            except EditError as e:
+                print(f"Journal edits for {filename} failed, rewriting instead: {e}")
+
+        if updated_entry is None:
+            prompt = build_journal_prompt(
+                existing_entry, user_input, conversation_context
+            )
+            updated_entry = await stream_journal_update(
+                client,
+                config["model"],
+                filename,
+                prompt,
+                on_progress,
+                base_revision=revision,
+            )
+    except RevisionConflict:
+        print(f"Journal entry {filename} was edited elsewhere during the update")
+        status_message.content = (
+            f"Journal entry '{filename}' was changed while it was being updated, "
+            "so the update was stopped. Reload the entry and try again."
+        )
+        await status_message.update()
+        return None
+    except Exception as e:
+        print(f"Error updating journal entry {filename}: {e}")
+        status_message.content = (
+            f"Journal entry '{filename}' could not be updated, it was left unchanged."
+        )
+        await status_message.update()
+        return None
+
+    # Re-index the entry in the background
+    schedule_update(filename)
 
-    # Generate journal entry using LLM
-    updated_entry = await generate_journal_entry(prompt)
+    status_message.content = f"Journal entry '{filename}' has been updated. Here's a summary of the changes:\n\n{updated_entry[:200]}..."
+    await status_message.update()
+    return updated_entry
 
-    # Write the updated entry to the file
-    with open(file_path, "w") as f:
-        f.write(updated_entry.strip())
 
-    return filename
+async def run_tool_call(tool_call):
+    """Run one native tool call.
+
+    Malformed arguments and errors raised by the tool become its result, so
+    one failing tool doesn't end the turn for the others.
+    """
+    try:
+        params = json.loads(tool_call["arguments"] or "{}")
+    except json.JSONDecodeError:
+        params = None
+    if not isinstance(params, dict):
+        return f"Error: the arguments for {tool_call['name']} were not valid JSON."
+    try:
+        return await call_function(
+            {"function_name": tool_call["name"], "params": params}
+        )
+    except Exception as e:
+        print(f"Error running tool {tool_call['name']}: {e}")
+        return f"Error: {tool_call['name']} failed, so its results are unavailable."
 
 
 @observe
-async def generate_response(message_history):
-    response = await client.chat.completions.create(
-        model=config["model"],
-        messages=message_history,
-        temperature=0.3,
-        max_tokens=500,
-    )
-    return response.choices[0].message.content
+async def answer_with_tools(message_history):
+    """Answer a question using the provider's native tool calling.
+
+    Independent tool calls run in parallel and a question that needs no tool
+    costs a single streamed completion. The model may chain tools for up to
+    MAX_TOOL_ROUNDS rounds; the last one is asked for without tools, so it
+    has to answer. Returns None if the provider rejects the tools request, in
+    which case nothing has been shown yet.
+    """
+    message_history = [
+        {"role": "system", "content": TOOLS_SYSTEM_PROMPT},
+        *message_history[1:],
+    ]
+    try:
+        response_text, _, tool_calls = await stream_response(
+            message_history, use_tools=True
+        )
+    except openai.BadRequestError as e:
+        print(f"Tool calling unavailable, using JSON function calls: {e}")
+        return None
+
+    rounds = 0
+    while tool_calls and rounds < MAX_TOOL_ROUNDS:
+        rounds += 1
+        message_history.append(
+            {
+                "role": "assistant",
+                "content": response_text or None,
+                "tool_calls": [
+                    {
+                        "id": tool_call["id"],
+                        "type": "function",
+                        "function": {
+                            "name": tool_call["name"],
+                            "arguments": tool_call["arguments"],
+                        },
+                    }
+                    for tool_call in tool_calls
+                ],
+            }
+        )
+
+        function_responses = await asyncio.gather(
+            *(run_tool_call(tool_call) for tool_call in tool_calls)
+        )
+
+        for tool_call, function_response in zip(tool_calls, function_responses):
+            # Display the function response to the user
+            await cl.Message(content=f"Function result: {function_response}").send()
+            message_history.append(
+                {
+                    "role": "tool",
+                    "tool_call_id": tool_call["id"],
+                    "content": str(function_response),
+                }
+            )
+
+        response_text, _, tool_calls = await stream_response(
+            message_history, use_tools=rounds < MAX_TOOL_ROUNDS
+        )
+    return response_text
 
 
 @observe
-async def generate_journal_entry(prompt: str) -> str:
-    response = await client.chat.completions.create(
-        model=config["model"],
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.7,
-        max_tokens=1000,
-    )
-    return response.choices[0].message.content
+async def answer_with_json_functions(message_history):
+    """Answer a question by parsing a function call JSON out of the response.
+
+    Fallback for models without native tool calling.
+    """
+    response_text, response_message, _ = await stream_response(message_history)
+
+    # Handle function calls for questions
+    try:
+        parsed_json = extract_json_from_response(response_text)
+        if (
+            parsed_json
+            and "function_name" in parsed_json
+            and parsed_json["function_name"] in function_names
+        ):
+            # The call followed some streamed text: keep only that text
+            if response_message is not None:
+                response_message.content = response_text.split("```")[0].strip()
+                if response_message.content:
+                    await response_message.update()
+                else:
+                    await response_message.remove()
+
+            function_response = await call_function(parsed_json)
+
+            # Display the function response to the user
+            await cl.Message(content=f"Function result: {function_response}").send()
+
+            message_history.append(
+                {
+                    "role": "system",
+                    "content": f"Function {parsed_json['function_name']} returned: {function_response}",
+                }
+            )
+            response_text, response_message, _ = await stream_response(message_history)
+    except Exception as e:
+        print(f"Error in JSON processing: {e}")
+
+    # Held back as a possible function call, but it wasn't one
+    if response_message is None:
+        await cl.Message(content=response_text).send()
+
+    return response_text
 
 
 @cl.on_message
 async def on_message(message: cl.Message):
     message_history = cl.user_session.get("message_history", [])
     current_entry = cl.user_session.get("current_entry")
-    calendar_index = cl.user_session.get("calendar_index")
 
     # Check if the message is a system message for loading or reloading an entry
     if message.type == "system_message":
@@ -244,8 +471,7 @@ async def on_message(message: cl.Message):
                 filename = data.get("filename")
                 if filename:
                     # Load the journal entry
-                    with open(os.path.join("data", filename), "r") as f:
-                        entry_content = f.read()
+                    entry_content = await asyncio.to_thread(read_entry, filename)
 
                     # Update the current entry
                     cl.user_session.set("current_entry", filename)
@@ -278,27 +504,11 @@ async def on_message(message: cl.Message):
         user_content = user_input[2:].strip()
         message_type = "journal"
 
-        # Include the current journal entry and recent conversation history
-        if current_entry:
-            with open(os.path.join("data", current_entry), "r") as f:
-                entry_content = f.read()
-
-            # Get the last few messages from the conversation history
-            recent_history = message_history[-5:]  # Adjust the number as needed
-            conversation_context = "\n".join(
-                [f"{msg['role']}: {msg['content']}" for msg in recent_history]
-            )
-
-            user_content = f"""Current journal entry:
-
-{entry_content}
-
-Recent conversation:
-{conversation_context}
-
-User input for journal update: {user_content}
-
-Please update the journal entry based on the user's input and the recent conversation context. Be sure to maintain the overall structure and flow of the existing entry while incorporating new information or addressing the user's specific request."""
+        # Recent conversation history gives the update its context
+        recent_history = message_history[-5:]  # Adjust the number as needed
+        conversation_context = "\n".join(
+            [f"{msg['role']}: {msg['content']}" for msg in recent_history]
+        )
 
     else:
         # Question mode (default): Use SYSTEM_PROMPT
@@ -308,10 +518,14 @@ Please update the journal entry based on the user's input and the recent convers
 
         # Include the current journal entry context if available
         if current_entry:
-            with open(os.path.join("data", current_entry), "r") as f:
-                entry_content = f.read()
+            entry_content = await asyncio.to_thread(read_entry, current_entry)
             user_content = f"Current journal entry:\n\n{entry_content}\n\nUser question: {user_content}"
 
+        # Relative dates like "last week" need today's date to become a range
+        user_content = (
+            f"Today's date: {datetime.date.today().isoformat()}\n\n{user_content}"
+        )
+
     # Update message history with the appropriate system prompt
     message_history = [
         {"role": "system", "content": system_prompt},
@@ -322,45 +536,19 @@ Please update the journal entry based on the user's input and the recent convers
 
     # Generate response based on the message type
     if message_type == "question":
-        response_text = await generate_response(message_history)
-
-        # Handle function calls for questions
-        try:
-            parsed_json = extract_json_from_response(response_text)
-            if (
-                parsed_json
-                and "function_name" in parsed_json
-                and parsed_json["function_name"] in function_names
-            ):
-                function_response = await call_function(parsed_json)
-
-                # Display the function response to the user
-                await cl.Message(content=f"Function result: {function_response}").send()
-
-                message_history.append(
-                    {
-                        "role": "system",
-                        "content": f"Function {parsed_json['function_name']} returned: {function_response}",
-                    }
-                )
-                response_text = await generate_response(message_history)
-        except Exception as e:
-            print(f"Error in JSON processing: {e}")
-
-        await print_response(response_text)
+        response_text = None
+        if cl.user_session.get("tools_supported", TOOL_CALLING):
+            response_text = await answer_with_tools(message_history)
+            if response_text is None:
+                cl.user_session.set("tools_supported", False)
+        if response_text is None:
+            response_text = await answer_with_json_functions(message_history)
     elif message_type == "journal" and current_entry:
-        response_text = await generate_response(message_history)
-        updated_filename = await update_journal_file(current_entry, response_text)
-        await cl.Message(
-            content=f"Journal entry '{updated_filename}' has been updated. Here's a summary of the changes:\n\n{response_text[:200]}..."
-        ).send()
-
-        # Notify the frontend about the update
-        if cl.context.session.client_type == "copilot":
-            fn = cl.CopilotFunction(
-                name="update_journal", args={"filename": updated_filename}
-            )
-            await fn.acall()
+        response_text = await update_journal_file(
+            current_entry, user_content, conversation_context
+        )
+        if response_text is None:
+            response_text = f"Journal entry '{current_entry}' could not be updated."
     else:
         response_text = (
             "No current journal entry is loaded. Please load an entry before updating."
@@ -375,26 +563,3 @@ Please update the journal entry based on the user's input and the recent convers
 @cl.action_callback("reauth")
 async def on_action(action):
     await handle_reauth()
-
-
-# Update this function to handle journal updates for a specific entry
-async def update_journal_file(filename: str, new_content: str):
-    file_path = os.path.join("data", filename)
-
-    # Read existing content
-    with open(file_path, "r") as f:
-        existing_content = f.read().strip()
-
-    # Prepare the prompt for the LLM
-    prompt = JOURNAL_PROMPT.format(
-        existing_entry=existing_content, user_content=new_content
-    )
-
-    # Generate journal entry using LLM
-    updated_entry = await generate_journal_entry(prompt)
-
-    # Write the updated entry to the file
-    with open(file_path, "w") as f:
-        f.write(updated_entry.strip())
-
-    return filename
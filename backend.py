@@ -5,33 +5,30 @@ from datetime import datetime, timedelta
 import re
 import html2text
 import json
-from calendar_utils import CACHE_FILE, fetch_and_filter_calendar_events
+from calendar_utils import (
+    fetch_and_filter_calendar_events,
+    get_event_store,
+    get_sync_metrics,
+)
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+from journal_log import RevisionConflict
+from journal_store import get_journal_store
 
 app = Flask(__name__, static_folder="static")
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Update the CACHE_FILE path
-CACHE_EXPIRY = timedelta(hours=1)
+# Rendered entries, keyed by (filename, revision), least recently used first
+RENDER_CACHE_SIZE = int(os.getenv("RENDER_CACHE_SIZE", "128"))
+_rendered = OrderedDict()
+_rendered_lock = threading.Lock()
 
-
-def load_cache():
-    try:
-        with open(CACHE_FILE, "r") as f:
-            cache = json.load(f)
-        if datetime.fromisoformat(cache["timestamp"]) + CACHE_EXPIRY > datetime.now():
-            return cache["events"]
-    except (FileNotFoundError, json.JSONDecodeError, KeyError):
-        pass
-    return None
-
-
-def save_cache(events):
-    cache = {"timestamp": datetime.now().isoformat(), "events": events}
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f)
+_markdown = markdown.Markdown()
+_markdown_lock = threading.Lock()
 
 
 def generate_unique_filename():
@@ -40,44 +37,110 @@ def generate_unique_filename():
     return f"{today}-{timestamp}-entry.md"
 
 
+def _date_range():
+    """The from and to query parameters as dates; raises ValueError if invalid."""
+    return tuple(
+        datetime.strptime(value, "%Y-%m-%d").date() if value else None
+        for value in (request.args.get("from"), request.args.get("to"))
+    )
+
+
 @app.route("/api/journal-entries")
 def get_journal_entries():
     logging.info("GET /api/journal-entries")
-    entries = []
-    for filename in os.listdir("data"):
-        if filename.endswith(".md"):
-            file_path = os.path.join("data", filename)
-            with open(file_path, "r") as f:
-                content = f.read().split("\n")
-                title = content[0].strip("# ")  # Remove Markdown heading syntax
-                body = content[1] if len(content) > 1 else ""
-                date_str = filename.split("-")[:3]
-                date = "-".join(date_str[:3])  # Keep as YYYY-MM-DD
-                preview = body[:100] + "..." if len(body) > 100 else body
-                entries.append(
-                    {
-                        "date": date,
-                        "title": title,
-                        "preview": preview,
-                        "filename": filename,
-                    }
-                )
-    # Sort entries by filename in descending order (latest first)
-    entries.sort(key=lambda x: x["filename"], reverse=True)
-    return jsonify(entries)
+    limit = request.args.get("limit", type=int)
+    before = request.args.get("before")
+    if limit is not None and limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    try:
+        start_date, end_date = _date_range()
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM-DD"}), 400
+
+    # Served from the journal store's index, latest first; X-Next-Cursor is the
+    # "before" value for the next page and is absent on the last one
+    entries, next_cursor = get_journal_store().list_entries(
+        limit=limit, before=before, start_date=start_date, end_date=end_date
+    )
+    response = jsonify(entries)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    etag = hashlib.sha256(response.get_data()).hexdigest()[:16]
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@app.route("/api/search")
+def search_journal_entries():
+    logging.info("GET /api/search")
+    query = request.args.get("q", "")
+    limit = request.args.get("limit", 20, type=int)
+    if limit < 1:
+        return jsonify({"error": "limit must be positive"}), 400
+    try:
+        start_date, end_date = _date_range()
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM-DD"}), 400
+
+    # Entries containing every word of q, best match first
+    return jsonify(
+        get_journal_store().search(
+            query, limit=limit, start_date=start_date, end_date=end_date
+        )
+    )
+
+
+def render_entry(filename):
+    """Return (HTML, revision) for an entry, rendered once per revision."""
+    store = get_journal_store()
+    revision = store.revision(filename)
+    key = (filename, revision)
+    with _rendered_lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key], revision
+
+    content, revision = store.read_entry_with_revision(filename)
+    key = (filename, revision)
+
+    # Markdown instances keep state between conversions, so share one under a lock
+    with _markdown_lock:
+        html_content = _markdown.reset().convert(content)
+
+    with _rendered_lock:
+        _rendered[key] = html_content
+        while len(_rendered) > RENDER_CACHE_SIZE:
+            _rendered.popitem(last=False)
+    return html_content, revision
 
 
 @app.route("/api/journal-entry/<filename>")
 def get_journal_entry(filename):
     logging.info(f"GET /api/journal-entry/{filename}")
-    file_path = os.path.join("data", filename)
-    if os.path.exists(file_path):
-        with open(file_path, "r") as f:
-            content = f.read()
+    try:
+        revision = get_journal_store().revision(filename)
+    except FileNotFoundError:
+        return "Entry not found", 404
+
+    # The revision identifies the rendering, so an unchanged entry is
+    # answered with a 304 without reading it
+    if request.if_none_match.contains(revision):
+        response = app.response_class(status=304)
+    else:
+        try:
             # Convert Markdown to HTML for display in the editor
-            html_content = markdown.markdown(content)
-            return html_content
-    return "Entry not found", 404
+            html_content, revision = render_entry(filename)
+        except FileNotFoundError:
+            return "Entry not found", 404
+        response = app.response_class(html_content, mimetype="text/html")
+
+    # The revision autosave deltas are based on
+    response.set_etag(revision)
+    response.headers["X-Entry-Revision"] = revision
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/")
@@ -97,11 +160,9 @@ def create_new_entry():
     logging.info("POST /api/new-entry")
     filename = generate_unique_filename()
     title = f"Today, ..."
-    file_path = os.path.join("data", filename)
 
-    # Create a new entry file with minimal content
-    with open(file_path, "w") as f:
-        f.write(f"# {title}\n\n")
+    # Create a new entry with minimal content
+    revision = get_journal_store().create_entry(filename, f"# {title}\n\n")
 
     return jsonify(
         {
@@ -109,102 +170,150 @@ def create_new_entry():
             "title": title,
             "date": filename.split("-")[0],
             "preview": "",
+            "revision": revision,
+            "content": f"# {title}\n\n",
         }
     )
 
 
-@app.route("/api/update-entry/<filename>", methods=["POST"])
-def update_entry(filename):
-    logging.info(f"POST /api/update-entry/{filename}")
-    file_path = os.path.join("data", filename)
-    if not os.path.exists(file_path):
-        return jsonify({"error": "Entry not found"}), 404
+def normalize_entry(content):
+    """Put exactly one blank line between the title line and the body."""
+    lines = content.split("\n")
 
-    content = request.json.get("content")
-    if not content:
-        return jsonify({"error": "No content provided"}), 400
+    # The first non-empty line is the title
+    title_index = next((i for i, line in enumerate(lines) if line.strip()), None)
+    if title_index is None:
+        return "Untitled\n\n"
+    title = lines[title_index]
 
-    # Split the content into lines, preserving empty lines
-    lines = content.split("\n")
+    # The rest is the content, preserving all newlines except the blank lines
+    # right after the title, which would otherwise grow with every save
+    body = lines[title_index + 1 :]
+    while body and not body[0].strip():
+        body.pop(0)
+    return f"{title}\n\n" + "\n".join(body)
 
-    # Ensure there's at least one line
-    if not lines:
-        return jsonify({"error": "Empty content"}), 400
 
-    # The first non-empty line is the title
-    title = next((line for line in lines if line.strip()), "Untitled")
+@app.route("/api/update-entry/<filename>", methods=["POST"])
+def update_entry(filename):
+    """Save an entry, either in full or as a delta against a known revision.
 
-    # The rest is the content, preserving all newlines
-    body = "\n".join(lines[lines.index(title) + 1 :])
+    A delta is {"start", "end", "text"}: the text replacing characters start
+    to end of the entry at base_revision. If the entry has changed since
+    base_revision, for example through the chat, the save is refused with a
+    409 rather than overwriting that change.
+    """
+    logging.info(f"POST /api/update-entry/{filename}")
+    store = get_journal_store()
+    if not store.exists(filename):
+        return jsonify({"error": "Entry not found"}), 404
 
-    # Combine title and body, ensuring two newlines after the title
-    full_content = f"{title}\n\n{body}"
+    data = request.json or {}
+    base_revision = data.get("base_revision")
+    delta = data.get("delta")
+    content = data.get("content")
+    if delta is None and not content:
+        return jsonify({"error": "No content provided"}), 400
+    if delta is not None and base_revision is None:
+        return jsonify({"error": "A delta needs a base_revision"}), 400
 
-    # Write the content to the file
-    with open(file_path, "w") as f:
-        f.write(full_content)
+    # The store checks the revision and writes the edit atomically, so a
+    # save based on an entry the chat has since changed is refused
+    try:
+        if delta is not None:
+            try:
+                start, end, text = int(delta["start"]), int(delta["end"]), delta["text"]
+            except (KeyError, TypeError, ValueError):
+                return jsonify({"error": "Invalid delta"}), 400
+            if not isinstance(text, str):
+                return jsonify({"error": "Invalid delta"}), 400
+            content, revision = store.apply_delta(
+                filename, start, end, text, base_revision
+            )
+            base_revision = revision
+
+        full_content = normalize_entry(content)
+        if full_content != content or delta is None:
+            revision = store.write_entry(filename, full_content, base_revision)
+    except RevisionConflict as e:
+        return (
+            jsonify({"error": "Entry was changed elsewhere", "revision": e.revision}),
+            409,
+        )
+    except ValueError:
+        return jsonify({"error": "Invalid delta"}), 400
 
-    return jsonify({"message": "Entry updated successfully"})
+    result = {"message": "Entry updated successfully", "revision": revision}
+    if full_content != content:
+        # The client's copy no longer matches the entry, so send the entry back
+        result["content"] = full_content
+    response = jsonify(result)
+    response.headers["X-Entry-Revision"] = revision
+    return response
 
 
 @app.route("/api/calendar-events")
 def get_calendar_events():
     logging.info("GET /api/calendar-events")
     force_refresh = request.args.get("refresh", "").lower() == "true"
-    cached_events = None if force_refresh else load_cache()
-
-    if cached_events:
-        return jsonify(cached_events)
 
     try:
-        all_events, todays_events = fetch_and_filter_calendar_events()
-        events = {"all_events": all_events, "todays_events": todays_events}
-        save_cache(events)
-        return jsonify(events)
+        # Cached, TTL-checked and revalidated in the background by
+        # calendar_cache, which serves stale events if Google can't be reached
+        all_events, todays_events = fetch_and_filter_calendar_events(
+            force_refresh=force_refresh
+        )
     except Exception as e:
-        print(f"Error fetching calendar events: {e}")
-        cached_events = load_cache()
-        if cached_events:
-            return jsonify(cached_events)
+        # Nothing cached to fall back on, or the Google token needs refreshing
+        logging.error(f"Error fetching calendar events: {str(e)}")
         return jsonify({"error": "Unable to fetch events and no cache available"}), 500
 
+    return jsonify(
+        {
+            "all_events": [event.to_dict() for event in all_events],
+            "todays_events": [event.to_dict() for event in todays_events],
+        }
+    )
+
 
 @app.route("/api/calendar-events/<date>")
 def get_calendar_events_for_date(date):
     logging.info(f"GET /api/calendar-events/{date}")
     force_refresh = request.args.get("force_refresh", "").lower() == "true"
     try:
-        all_events, _ = fetch_and_filter_calendar_events(
-            target_date=date, force_refresh=force_refresh
-        )
+        target_date = datetime.strptime(date, "%Y-%m-%d").date()
+        if force_refresh:
+            fetch_and_filter_calendar_events(target_date=date, force_refresh=True)
 
-        date_events = []
-        for event in all_events:
-            try:
-                event_parts = event.split(", ")
-                event_dict = {
-                    part.split(": ")[0]: ": ".join(part.split(": ")[1:])
-                    for part in event_parts
-                }
-
-                event_date = event_dict["Start time"].split("T")[0]
-                if event_date == date:
-                    date_events.append(
-                        {
-                            "summary": event_dict["Summary"],
-                            "start": {"dateTime": event_dict["Start time"]},
-                            "end": {"dateTime": event_dict["End time"]},
-                        }
-                    )
-            except Exception as e:
-                logging.error(f"Error processing event: {e}")
+        # Per-day buckets include events spanning midnight
+        event_store = get_event_store(target_date - timedelta(days=7))
+        date_events = [
+            {"summary": event.summary, "start": event.start_raw, "end": event.end_raw}
+            for event in event_store.events_on(target_date)
+        ]
 
         logging.info(f"Found {len(date_events)} events for date {date}")
-        return jsonify(date_events)
+        response = jsonify(date_events)
+
+        # Let the browser revalidate and skip unchanged days with a 304
+        etag = hashlib.sha256(response.get_data()).hexdigest()[:16]
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         logging.error(f"Error fetching events for date {date}: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/metrics/calendar")
+def get_calendar_metrics():
+    logging.info("GET /api/metrics/calendar")
+    # Counters are per worker process
+    return jsonify(get_sync_metrics())
+
+
+# Fold logged entry edits into the .md files in the background
+get_journal_store().start_compactor()
+
 if __name__ == "__main__":
     app.run(debug=True)
@@ -0,0 +1,110 @@
+"""Compare list and search latency of the flat-file and SQLite journal stores.
+
+Run from the repository root; entries are generated in a scratch directory:
+
+    python -m benchmarks.journal_store_latency --entries 10000
+
+Listing covers the sidebar's first page and a one-month date range, cold
+(first request after start) and warm; search looks for a common and a rare
+word across every entry. The metadata index's TTL is set to 0, so every
+flat-file listing checks the files again, as the first one after the TTL
+would.
+"""
+
+import argparse
+import datetime
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+WORDS = (
+    "morning run coffee meeting project deadline dinner friends walk park "
+    "book chapter weekend family call tired happy anxious grateful rain sun "
+    "lunch code review garden music movie sleep travel train city market"
+).split()
+RARE_WORD = "zeppelin"
+
+PAGE_SIZE = 50
+
+
+def write_entries(directory, count):
+    """count entries, a few a day going back from today."""
+    random.seed(0)
+    os.makedirs(directory)
+    day = datetime.date.today()
+    for i in range(count):
+        if i % 3 == 0:
+            day -= datetime.timedelta(days=1)
+        body = " ".join(random.choices(WORDS, k=random.randint(80, 400)))
+        if i % 500 == 0:
+            body += f" {RARE_WORD}"
+        filename = f"{day.isoformat()}-{i % 3:02d}0000-entry.md"
+        with open(os.path.join(directory, filename), "w") as f:
+            f.write(f"# {day:%A}\n\n{body}\n")
+    return day
+
+
+def timed(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def measure(store, first_day, runs):
+    month_start = first_day + datetime.timedelta(days=30)
+    month_end = month_start + datetime.timedelta(days=30)
+    return {
+        "list (cold)": timed(lambda: store.list_entries(limit=PAGE_SIZE), 1),
+        "list": timed(lambda: store.list_entries(limit=PAGE_SIZE), runs),
+        "list month": timed(
+            lambda: store.list_entries(start_date=month_start, end_date=month_end),
+            runs,
+        ),
+        "search common": timed(lambda: store.search("coffee walk"), runs),
+        "search rare": timed(lambda: store.search(RARE_WORD), runs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # The stores work on data/ relative to the working directory
+    directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(directory)
+        first_day = write_entries("data", args.entries)
+
+        import journal_metadata
+        from journal_store import FlatFileStore, SQLiteStore, import_entries
+
+        journal_metadata.VALIDATE_SECONDS = 0
+
+        flat = FlatFileStore()
+        flat_results = measure(flat, first_day, args.runs)
+
+        sqlite = SQLiteStore(os.path.join("data", "journal.db"))
+        start = time.perf_counter()
+        import_entries("data", sqlite)
+        print(f"Imported {args.entries} entries in {time.perf_counter() - start:.1f}s")
+        sqlite_results = measure(SQLiteStore(sqlite.db_path), first_day, args.runs)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(directory)
+
+    print(f"{'':<14} {'files':>10} {'sqlite':>10}  (median ms, {args.runs} runs)")
+    for name in flat_results:
+        print(f"{name:<14} {flat_results[name]:10.2f} {sqlite_results[name]:10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""Compare the latency of the old two-call journal update with the single pass.
+
+Run from the repository root against the configured provider:
+
+    python -m benchmarks.journal_update_latency --runs 5
+
+The old flow asked for an updated entry, then sent that answer through
+JOURNAL_PROMPT a second time. The new flow streams the entry from one
+completion, so the editor shows text long before the update completes.
+"""
+
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from dotenv import load_dotenv
+from openai import AsyncOpenAI
+
+from journal_log import JournalLog
+from journal_update import build_journal_prompt, stream_journal_update
+from prompts import JOURNAL_PROMPT
+
+load_dotenv()
+
+SAMPLE_ENTRY = """# Tuesday
+
+Woke up early and went for a run along the river. Work was mostly meetings;
+the design review went better than expected.
+
+## Evening
+
+Cooked dinner with Sam and watched half a movie before falling asleep.
+"""
+
+SAMPLE_INPUT = "Add that I finally fixed the flaky deploy script after lunch."
+
+
+def make_client():
+    if os.getenv("OLLAMA") == "1":
+        endpoint = os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
+        client = AsyncOpenAI(api_key="ollama", base_url=f"{endpoint}/v1")
+        return client, os.getenv("OLLAMA_MODEL", "llama3.2")
+    return AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY")), "gpt-4o"
+
+
+async def old_flow(client, model, entry, user_input):
+    """Two sequential completions, as app.py did before the single pass."""
+    user_content = f"""Current journal entry:
+
+{entry}
+
+Recent conversation:
+
+
+User input for journal update: {user_input}
+
+Please update the journal entry based on the user's input and the recent conversation context. Be sure to maintain the overall structure and flow of the existing entry while incorporating new information or addressing the user's specific request."""
+
+    start = time.perf_counter()
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": JOURNAL_PROMPT},
+            {"role": "user", "content": user_content},
+        ],
+        temperature=0.3,
+        max_tokens=500,
+    )
+    prompt = JOURNAL_PROMPT.format(
+        existing_entry=entry.strip(),
+        user_content=response.choices[0].message.content,
+    )
+    await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.7,
+        max_tokens=1000,
+    )
+    total = time.perf_counter() - start
+    # Nothing reached the editor until both calls were done
+    return total, total
+
+
+async def new_flow(client, model, entry, user_input, directory):
+    """One streamed completion written to the entry as it arrives."""
+    # A fresh journal log per run, so earlier runs' edits aren't replayed
+    directory = tempfile.mkdtemp(dir=directory)
+    with open(os.path.join(directory, "entry.md"), "w") as f:
+        f.write(entry)
+    journal_log = JournalLog(directory)
+
+    first_update = None
+
+    async def on_progress(text, done):
+        nonlocal first_update
+        if first_update is None:
+            first_update = time.perf_counter() - start
+
+    start = time.perf_counter()
+    await stream_journal_update(
+        client,
+        model,
+        "entry.md",
+        build_journal_prompt(entry, user_input),
+        on_progress,
+        store=journal_log,
+    )
+    return first_update, time.perf_counter() - start
+
+
+def report(name, samples):
+    first = [sample[0] for sample in samples]
+    total = [sample[1] for sample in samples]
+    print(
+        f"{name:<12} first text {statistics.median(first):6.2f}s  "
+        f"total {statistics.median(total):6.2f}s (median of {len(samples)})"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--entry", help="Markdown entry to update")
+    parser.add_argument("--input", default=SAMPLE_INPUT, help="Journal update text")
+    args = parser.parse_args()
+
+    entry = SAMPLE_ENTRY
+    if args.entry:
+        with open(args.entry, "r") as f:
+            entry = f.read()
+
+    client, model = make_client()
+    directory = tempfile.mkdtemp()
+    try:
+        old_samples, new_samples = [], []
+        for _ in range(args.runs):
+            old_samples.append(await old_flow(client, model, entry, args.input))
+            new_samples.append(
+                await new_flow(client, model, entry, args.input, directory)
+            )
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"Model: {model}")
+    report("two calls", old_samples)
+    report("single pass", new_samples)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,115 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from file_utils import atomic_write_json, file_lock
+
+CACHE_FILE = os.path.join("data", "calendar_cache.json")
+LOCK_FILE = os.path.join("data", "calendar_cache.lock")
+
+# One TTL for every reader of the cache, Flask and Chainlit alike
+CACHE_TTL = timedelta(seconds=int(os.getenv("CALENDAR_CACHE_TTL", "3600")))
+
+# In-memory copy of the cache file, keyed by the file's mtime
+_memory = (None, None)
+_memory_lock = threading.Lock()
+
+_revalidating = False
+_revalidating_lock = threading.Lock()
+
+
+def load_cache():
+    """Return the cache as {"timestamp": ..., "events": ...}, or None."""
+    global _memory
+
+    try:
+        mtime = os.stat(CACHE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+    with _memory_lock:
+        if _memory[0] == mtime:
+            return _memory[1]
+
+    try:
+        with open(CACHE_FILE, "r") as f:
+            cache = json.load(f)
+        datetime.fromisoformat(cache["timestamp"])
+        cache["events"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+
+    with _memory_lock:
+        _memory = (mtime, cache)
+    return cache
+
+
+def save_cache(events):
+    global _memory
+
+    cache = {"timestamp": datetime.now().isoformat(), "events": events}
+    with file_lock(LOCK_FILE):
+        atomic_write_json(CACHE_FILE, cache)
+        mtime = os.stat(CACHE_FILE).st_mtime_ns
+
+    with _memory_lock:
+        _memory = (mtime, cache)
+    return cache
+
+
+def is_fresh(cache):
+    return datetime.fromisoformat(cache["timestamp"]) + CACHE_TTL > datetime.now()
+
+
+def refresh(fetch):
+    """Call fetch() and store its result in the cache."""
+    return save_cache(fetch())["events"]
+
+
+def _revalidate(fetch):
+    global _revalidating
+
+    try:
+        refresh(fetch)
+    except Exception as e:
+        print(f"Error revalidating calendar cache: {e}")
+    finally:
+        with _revalidating_lock:
+            _revalidating = False
+
+
+def _revalidate_in_background(fetch):
+    global _revalidating
+
+    with _revalidating_lock:
+        if _revalidating:
+            return
+        _revalidating = True
+
+    threading.Thread(
+        target=_revalidate, args=(fetch,), name="calendar-revalidate", daemon=True
+    ).start()
+
+
+def get_events(fetch, force_refresh=False):
+    """Return calendar events through the cache.
+
+    Fresh entries are served from memory. Stale entries are served as-is while
+    fetch() refreshes them in the background, so readers never wait on Google.
+    Only a missing cache or a forced refresh waits for fetch(); if that fails,
+    whatever is cached is served instead.
+    """
+    cache = load_cache()
+    if cache is not None and not force_refresh:
+        if not is_fresh(cache):
+            _revalidate_in_background(fetch)
+        return cache["events"]
+
+    try:
+        return refresh(fetch)
+    except Exception as e:
+        if cache is None:
+            raise
+        print(f"Error refreshing calendar cache, serving cached events: {e}")
+        return cache["events"]
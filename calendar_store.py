@@ -0,0 +1,128 @@
+import bisect
+import datetime
+
+from custom_calendar_reader import format_event
+
+
+def _parse_time(value):
+    """Parse a dateTime or date field, keeping the event's own wall-clock time.
+
+    Dates are compared the way the user sees them in their calendar, so the
+    UTC offset is dropped after parsing rather than converting to UTC.
+    """
+    if "dateTime" in value:
+        parsed = datetime.datetime.fromisoformat(value["dateTime"])
+        return parsed.replace(tzinfo=None), False
+    return datetime.datetime.fromisoformat(value["date"]), True
+
+
+class CalendarEvent:
+    """A calendar event with its start and end times already parsed."""
+
+    __slots__ = (
+        "id",
+        "status",
+        "summary",
+        "start",
+        "end",
+        "all_day",
+        "start_raw",
+        "end_raw",
+        "organizer",
+    )
+
+    def __init__(self, id, status, summary, start_raw, end_raw, organizer=None):
+        self.id = id
+        self.status = status
+        self.summary = summary
+        self.start_raw = start_raw
+        self.end_raw = end_raw
+        self.organizer = organizer or {}
+        self.start, self.all_day = _parse_time(start_raw)
+        self.end, _ = _parse_time(end_raw)
+
+    @classmethod
+    def from_api(cls, event):
+        """Build an event from a Google Calendar item or a to_dict() result."""
+        return cls(
+            id=event.get("id"),
+            status=event.get("status", "confirmed"),
+            summary=event.get("summary", ""),
+            start_raw=event["start"],
+            end_raw=event["end"],
+            organizer=event.get("organizer"),
+        )
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "summary": self.summary,
+            "start": self.start_raw,
+            "end": self.end_raw,
+            "organizer": self.organizer,
+        }
+
+    def to_text(self):
+        """Text used to embed the event, derived only when indexing."""
+        return format_event(self.to_dict())
+
+    def days(self):
+        """Every date the event covers, so multi-day events are found on each."""
+        day = self.start.date()
+        # End times are exclusive: an event ending at midnight doesn't cover that day
+        last_day = day
+        if self.end > self.start:
+            last_day = (self.end - datetime.timedelta(microseconds=1)).date()
+        while day <= last_day:
+            yield day
+            day += datetime.timedelta(days=1)
+
+    def __repr__(self):
+        return f"CalendarEvent({self.summary!r}, {self.start.isoformat()})"
+
+
+class EventStore:
+    """Calendar events kept sorted by start time for binary-searched lookups.
+
+    A per-day bucket index is built up front so events on a given date,
+    including ones spanning midnight, are a single dict lookup.
+    """
+
+    def __init__(self, events=()):
+        self._events = sorted(events, key=lambda event: event.start)
+        self._starts = [event.start for event in self._events]
+        self._by_day = {}
+        for event in self._events:
+            for day in event.days():
+                self._by_day.setdefault(day, []).append(event)
+
+    @classmethod
+    def from_api(cls, events):
+        return cls(CalendarEvent.from_api(event) for event in events)
+
+    def __len__(self):
+        return len(self._events)
+
+    def __iter__(self):
+        return iter(self._events)
+
+    def starting_between(self, start_date, end_date):
+        """Events starting on any day from start_date to end_date, inclusive."""
+        lo = bisect.bisect_left(
+            self._starts, datetime.datetime.combine(start_date, datetime.time.min)
+        )
+        hi = bisect.bisect_left(
+            self._starts,
+            datetime.datetime.combine(
+                end_date + datetime.timedelta(days=1), datetime.time.min
+            ),
+        )
+        return self._events[lo:hi]
+
+    def starting_on(self, date):
+        return self.starting_between(date, date)
+
+    def events_on(self, date):
+        """Events taking place on date, including ones that started earlier."""
+        return self._by_day.get(date, [])
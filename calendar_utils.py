@@ -1,104 +1,327 @@
 import asyncio
-from custom_calendar_reader import GoogleCalendarReader
+import functools
+import itertools
+from custom_calendar_reader import GoogleCalendarReader, SyncTokenExpiredError
+from calendar_store import CalendarEvent, EventStore
 import datetime
-import re
 import json
 from google.auth.exceptions import RefreshError
-from llama_index.core import VectorStoreIndex, Document, Settings
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.schema import TextNode
 import os
-from llama_index.embeddings.openai import OpenAIEmbedding
+import threading
+import time
 from llama_index.llms.openai import OpenAI
 from llama_index.llms.ollama import Ollama
-from llama_index.embeddings.ollama import OllamaEmbedding
+from embedding_cache import get_embed_model, get_embedding_cache
+import calendar_cache
+from file_utils import atomic_write_json, file_lock
+from response_cache import invalidate as invalidate_responses
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Define and export CACHE_FILE
-CACHE_FILE = os.path.join("data", "calendar_cache.json")
+# Raw events by id plus the sync token used to fetch only changes
+EVENT_STORE_FILE = os.path.join("data", "calendar_events.json")
+EVENT_STORE_LOCK_FILE = os.path.join("data", "calendar_events.lock")
+
+# Synced events indexed by day, rebuilt only when the event store file changes
+_indexed_store = (None, None, EventStore())
 
 # Add this line near the top of the file, after imports
 calendar_reader = GoogleCalendarReader()
 
+# Syncs within this many seconds of the last one reuse its result
+CALENDAR_MIN_REFRESH_SECONDS = int(os.getenv("CALENDAR_MIN_REFRESH_SECONDS", "30"))
+
+# Single-flight state for sync_calendar_events, plus counters for /api/metrics
+sync_metrics = {"fetches": 0, "coalesced": 0, "rate_limited": 0}
+_sync_in_flight = None
+_sync_lock = threading.Lock()
+
 # Choose AI provider
 USE_OLLAMA = os.getenv("OLLAMA") == "1"
 
-# Ollama embedding configuration
-OLLAMA_EMBEDDING_CONFIG = {
-    "model_name": os.getenv("OLLAMA_MODEL", "nomic-embed-text"),
-    "base_url": os.getenv("OLLAMA_EMBED_ENDPOINT", "http://localhost:11434"),
-}
+# How often the shared calendar index is rebuilt in the background
+CALENDAR_REFRESH_SECONDS = int(os.getenv("CALENDAR_REFRESH_SECONDS", "900"))
 
-# OpenAI embedding configuration
-OPENAI_EMBEDDING_CONFIG = {
-    "model": "text-embedding-ada-002",
-    "api_key": os.getenv("OPENAI_API_KEY"),
-}
+# Number of events embedded and inserted into the index at a time
+CALENDAR_INDEX_BATCH_SIZE = 100
 
 
-def load_cache():
+def load_event_store():
     try:
-        with open(CACHE_FILE, "r") as f:
-            cache = json.load(f)
-        return cache["events"]
+        with open(EVENT_STORE_FILE, "r") as f:
+            store = json.load(f)
+        if isinstance(store["events"], dict):
+            return store
     except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+    return {"sync_token": None, "time_min": None, "events": {}}
+
+
+def save_event_store(store):
+    atomic_write_json(EVENT_STORE_FILE, store)
+
+
+class _Flight:
+    """A sync in progress that other threads can wait on for its result."""
+
+    def __init__(self, start_date, bypass_rate_limit):
+        self.start_date = start_date
+        self.bypass_rate_limit = bypass_rate_limit
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def get_sync_metrics():
+    with _sync_lock:
+        return dict(sync_metrics)
+
+
+def _count(metric):
+    with _sync_lock:
+        sync_metrics[metric] += 1
+
+
+def sync_calendar_events(start_date, bypass_rate_limit=False):
+    """Bring the local event store up to date and return its events.
+
+    Only changes since the last sync are fetched. A full sync happens on first
+    use, when the API expires the sync token (410 Gone) or when start_date is
+    earlier than what the store covers.
+
+    Concurrent calls share one fetch: threads wait on the in-flight sync and
+    other processes on the event store lock, and a sync that finished within
+    CALENDAR_MIN_REFRESH_SECONDS is reused instead of fetching again, unless
+    bypass_rate_limit is set: re-authentication has to reach Google.
+    """
+    global _sync_in_flight
+
+    with _sync_lock:
+        flight = _sync_in_flight
+        if (
+            flight is None
+            or flight.start_date > start_date
+            or bypass_rate_limit
+            and not flight.bypass_rate_limit
+        ):
+            flight = _sync_in_flight = _Flight(start_date, bypass_rate_limit)
+            is_leader = True
+        else:
+            is_leader = False
+
+    if not is_leader:
+        flight.done.wait()
+        _count("coalesced")
+        if flight.error:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = _locked_sync(start_date, bypass_rate_limit)
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        flight.done.set()
+        with _sync_lock:
+            if _sync_in_flight is flight:
+                _sync_in_flight = None
+
+
+def _locked_sync(start_date, bypass_rate_limit=False):
+    global _indexed_store
+
+    requested_at = time.time()
+
+    # Hold the lock across read, fetch and write so concurrent syncs from
+    # other processes can't apply the same delta twice or lose one
+    with file_lock(EVENT_STORE_LOCK_FILE):
+        store = load_event_store()
+        synced_at = store.get("synced_at", 0)
+        covered = (
+            store["time_min"] is not None
+            and start_date.isoformat() >= store["time_min"]
+        )
+
+        if covered and synced_at >= requested_at:
+            # Another process synced while we were waiting for the lock
+            _count("coalesced")
+            event_store = EventStore.from_api(store["events"].values())
+            time_min = store["time_min"]
+        elif (
+            covered
+            and not bypass_rate_limit
+            and requested_at - synced_at < CALENDAR_MIN_REFRESH_SECONDS
+        ):
+            _count("rate_limited")
+            event_store = EventStore.from_api(store["events"].values())
+            time_min = store["time_min"]
+        else:
+            _count("fetches")
+            event_store, time_min = _sync_event_store(store, start_date)
+
+        _indexed_store = (
+            os.stat(EVENT_STORE_FILE).st_mtime_ns,
+            time_min,
+            event_store,
+        )
+    return event_store
+
+
+def _apply_sync_pages(events, pages):
+    """Apply synced pages to events by id; returns (changes, next sync token)."""
+    changes = 0
+    sync_token = None
+    for items, sync_token in pages:
+        for item in items:
+            if item.get("status") == "cancelled":
+                events.pop(item["id"], None)
+            else:
+                events[item["id"]] = item
+        changes += len(items)
+    return changes, sync_token
+
+
+def _sync_event_store(store, start_date):
+    events = store["events"]
+    sync_token = store["sync_token"]
+    time_min = store["time_min"]
+
+    if time_min is None or start_date.isoformat() < time_min:
+        sync_token = None
+
+    # Pages are applied as they arrive, so the changes are never all held
+    # at once on top of the events
+    changes = None
+    if sync_token:
+        try:
+            changes, sync_token = _apply_sync_pages(
+                events, calendar_reader.iter_sync_pages(sync_token=sync_token)
+            )
+        except SyncTokenExpiredError:
+            print("Calendar sync token expired, doing a full resync")
+
+    if changes is None:
+        events = {}
+        time_min = start_date.isoformat()
+        changes, sync_token = _apply_sync_pages(
+            events, calendar_reader.iter_sync_pages(start_date=start_date)
+        )
+
+    save_event_store(
+        {
+            "sync_token": sync_token,
+            "time_min": time_min,
+            "synced_at": time.time(),
+            "events": events,
+        }
+    )
+    print(f"Calendar synced: {changes} change(s), {len(events)} event(s) stored")
+
+    return EventStore.from_api(events.values()), time_min
+
+
+def get_event_store(start_date=None):
+    """Return all synced events as an EventStore for per-date lookups.
+
+    Syncs first if nothing has been synced yet or start_date predates what
+    the store covers.
+    """
+    global _indexed_store
+
+    try:
+        mtime = os.stat(EVENT_STORE_FILE).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime is not None and _indexed_store[0] != mtime:
+        store = load_event_store()
+        _indexed_store = (
+            mtime,
+            store["time_min"],
+            EventStore.from_api(store["events"].values()),
+        )
+
+    _, time_min, event_store = _indexed_store
+    if time_min is None or (start_date and start_date.isoformat() < time_min):
+        try:
+            return sync_calendar_events(start_date or datetime.date.today())
+        except RefreshError:
+            raise
+        except Exception as e:
+            print(f"Error syncing calendar events: {e}")
+    return event_store
+
+
+def _events_from_cache(cached_events):
+    try:
+        return (
+            [CalendarEvent.from_api(e) for e in cached_events["all_events"]],
+            [CalendarEvent.from_api(e) for e in cached_events["todays_events"]],
+        )
+    except (KeyError, TypeError, AttributeError, ValueError):
+        # Written by an older version that cached flat event strings
         return None
 
 
-def save_cache(cache):
-    with open(CACHE_FILE, "w") as f:
-        json.dump(cache, f)
+def _window(event_store, target_date):
+    start_date = target_date - datetime.timedelta(days=7)
+    end_date = target_date + datetime.timedelta(days=7)
+    return (
+        event_store.starting_between(start_date, end_date),
+        event_store.starting_on(target_date),
+    )
+
+
+def fetch_calendar_events(bypass_rate_limit=False):
+    """Sync with Google and return the week around today in cacheable form."""
+    today = datetime.date.today()
+    event_store = sync_calendar_events(
+        today - datetime.timedelta(days=7), bypass_rate_limit
+    )
+    all_events, todays_events = _window(event_store, today)
+    return {
+        "all_events": [event.to_dict() for event in all_events],
+        "todays_events": [event.to_dict() for event in todays_events],
+    }
 
 
-def fetch_and_filter_calendar_events(target_date=None, force_refresh=False):
+def fetch_and_filter_calendar_events(
+    target_date=None, force_refresh=False, bypass_rate_limit=False
+):
+    """Return CalendarEvents within a week of target_date and those on it.
+
+    bypass_rate_limit makes a forced refresh reach Google even if it was
+    synced moments ago, as re-authentication needs.
+    """
     if target_date:
         target_date = datetime.datetime.strptime(target_date, "%Y-%m-%d").date()
     else:
         target_date = datetime.date.today()
 
-    start_date = target_date - datetime.timedelta(days=7)
-    end_date = target_date + datetime.timedelta(days=7)
-
     try:
-        if not force_refresh:
-            cached_events = load_cache()
-            if cached_events:
-                return cached_events["all_events"], cached_events["todays_events"]
-
-        calendar_documents = calendar_reader.load_data(
-            number_of_results=100,
-            start_date=start_date,
-        )
+        # The shared cache holds the window around today; other dates are
+        # computed from the synced event store
+        if target_date != datetime.date.today():
+            start_date = target_date - datetime.timedelta(days=7)
+            if force_refresh:
+                event_store = sync_calendar_events(start_date, bypass_rate_limit)
+            else:
+                event_store = get_event_store(start_date)
+            return _window(event_store, target_date)
 
-        all_events = [event.text for event in calendar_documents]
-        filtered_events = [
-            event
-            for event in all_events
-            if start_date
-            <= datetime.datetime.fromisoformat(
-                re.search(r"Start time: (\S+)", event).group(1).rstrip(",")
-            ).date()
-            <= end_date
-        ]
-
-        todays_events = [
-            event
-            for event in filtered_events
-            if datetime.datetime.fromisoformat(
-                re.search(r"Start time: (\S+)", event).group(1).rstrip(",")
-            ).date()
-            == target_date
-        ]
-
-        save_cache(
-            {
-                "all_events": filtered_events,
-                "todays_events": todays_events,
-                "last_updated": datetime.datetime.now().isoformat(),
-            }
+        cached_events = calendar_cache.get_events(
+            functools.partial(fetch_calendar_events, bypass_rate_limit),
+            force_refresh=force_refresh,
         )
-        return filtered_events, todays_events
+        events = _events_from_cache(cached_events)
+        if events is None:
+            events = _events_from_cache(calendar_cache.refresh(fetch_calendar_events))
+        return events
     except RefreshError as e:
         print(f"Error refreshing Google Calendar token: {e}")
         raise
@@ -107,38 +330,127 @@ def fetch_and_filter_calendar_events(target_date=None, force_refresh=False):
         return [], []
 
 
-async def create_calendar_index():
-    try:
-        all_events, todays_events = fetch_and_filter_calendar_events()
-        documents = [
-            Document(text=event, metadata={"source": "calendar"})
-            for event in all_events
-        ]
+def insert_in_batches(index, nodes, batch_size=CALENDAR_INDEX_BATCH_SIZE):
+    """Insert nodes from any iterable, holding only one batch in memory."""
+    nodes = iter(nodes)
+    while batch := list(itertools.islice(nodes, batch_size)):
+        index.insert_nodes(batch)
 
+
+def build_calendar_index(force_refresh=False, bypass_rate_limit=False):
+    try:
+        all_events, todays_events = fetch_and_filter_calendar_events(
+            force_refresh=force_refresh, bypass_rate_limit=bypass_rate_limit
+        )
         USE_OLLAMA = os.getenv("OLLAMA") == "1"
 
         if USE_OLLAMA:
-            embed_model = OllamaEmbedding(
-                model_name=os.getenv("OLLAMA_MODEL", "llama3.2"),
-                base_url=os.getenv("OLLAMA_EMBED_ENDPOINT", "http://localhost:11434"),
-            )
             llm = Ollama(
                 model=os.getenv("OLLAMA_MODEL", "llama3.2"),
                 base_url=os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434/v1"),
             )
         else:
-            embed_model = OpenAIEmbedding(**OPENAI_EMBEDDING_CONFIG)
             llm = OpenAI()
 
+        # Unchanged events are served from the embedding cache
+        embed_model = get_embed_model()
         Settings.embed_model = embed_model
         Settings.llm = llm
 
         # Create the index with the appropriate embedding
-        index = VectorStoreIndex.from_documents(documents)
+        index = VectorStoreIndex([], embed_model=embed_model)
+        insert_in_batches(
+            index,
+            (
+                TextNode(text=event.to_text(), metadata={"source": "calendar"})
+                for event in all_events
+            ),
+        )
+        print(f"Calendar index built, embedding cache: {get_embedding_cache().stats()}")
         return index, todays_events
     except RefreshError as e:
         print(f"Error refreshing Google Calendar token: {e}")
         return None, []
 
 
+async def create_calendar_index(force_refresh=False, bypass_rate_limit=False):
+    # Fetching and embedding block, so keep them off the event loop
+    return await asyncio.to_thread(
+        build_calendar_index, force_refresh, bypass_rate_limit
+    )
+
+
+class CalendarIndexError(RuntimeError):
+    """The calendar index could not be built, e.g. after a failed token refresh."""
+
+
+class CalendarIndexManager:
+    """Process-wide calendar index shared by every Chainlit session.
+
+    The index is built once, handed out by reference and rebuilt in the
+    background every refresh_interval seconds. Concurrent callers share a
+    single in-flight build.
+    """
+
+    def __init__(self, refresh_interval=CALENDAR_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.index = None
+        self.todays_events = []
+        self._build_task = None
+        self._refresh_task = None
+
+    async def get(self):
+        """Return the index and today's events; the index is None if it
+        couldn't be built."""
+        if self.index is None:
+            try:
+                await self.refresh()
+            except CalendarIndexError as e:
+                print(f"Error building calendar index: {e}")
+        self._start_refresh_loop()
+        return self.index, self.todays_events
+
+    async def refresh(self, force_refresh=False, bypass_rate_limit=False):
+        """Rebuild the index; raises CalendarIndexError if the rebuild failed.
+
+        With bypass_rate_limit, as after re-authentication, a fresh build is
+        started that reaches Google even if a sync just happened.
+        """
+        if self._build_task is None or self._build_task.done() or bypass_rate_limit:
+            self._build_task = asyncio.create_task(
+                self._build(force_refresh, bypass_rate_limit)
+            )
+        # Shield the shared build so one cancelled caller doesn't cancel it for all
+        return await asyncio.shield(self._build_task)
+
+    async def _build(self, force_refresh, bypass_rate_limit=False):
+        index, todays_events = await create_calendar_index(
+            force_refresh, bypass_rate_limit
+        )
+        if index is None:
+            # self.index, if any, keeps being served until a rebuild succeeds
+            raise CalendarIndexError("Calendar index could not be built")
+        self.index = index
+        self.todays_events = todays_events
+        # Answers from the previous index may no longer hold
+        invalidate_responses("calendar_search")
+        return self.index, self.todays_events
+
+    def _start_refresh_loop(self):
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh(force_refresh=True)
+            except Exception as e:
+                # Sessions keep using the previous index
+                print(f"Error refreshing calendar index: {e}")
+
+
+calendar_index_manager = CalendarIndexManager()
+
+
 # Add any other calendar-related functions as needed
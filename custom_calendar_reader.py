@@ -5,13 +5,80 @@ Source code in llama-index-integrations/readers/llama-index-readers-google/llama
 import os
 import datetime
 import json
-from typing import Any, List, Optional, Union
+from typing import Any, Iterator, List, Optional, Tuple, Union
 
 from llama_index.core.readers.base import BaseReader
 from llama_index.core.schema import Document
 
 SCOPES = ["https://www.googleapis.com/auth/calendar.readonly"]
 
+# Largest page the Calendar API returns by default
+DEFAULT_PAGE_SIZE = 250
+
+
+class SyncTokenExpiredError(Exception):
+    """The sync token is no longer valid and a full resync is required."""
+
+
+def _format_time_min(start_date: Optional[Union[str, datetime.date]]) -> str:
+    if start_date is None:
+        start_date = datetime.date.today()
+    elif isinstance(start_date, str):
+        start_date = datetime.date.fromisoformat(start_date)
+
+    start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
+    return start_datetime.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _iter_local_pages(local_data_filename: str, page_size: int) -> Iterator[dict]:
+    """Replay a saved events().list response page by page, like the API would.
+
+    The file holds either a single response, which is split into pages of
+    page_size, or a list of responses already split into pages.
+    """
+    with open(local_data_filename, "r") as file:
+        events_result = json.load(file)
+
+    if isinstance(events_result, list):
+        yield from events_result
+        return
+
+    items = events_result.get("items", [])
+    for offset in range(0, max(len(items), 1), page_size):
+        page = dict(events_result, items=items[offset : offset + page_size])
+        if offset + page_size < len(items):
+            page["nextPageToken"] = str(offset + page_size)
+            page.pop("nextSyncToken", None)
+        yield page
+
+
+def format_event(event: dict) -> str:
+    """Format a raw Google Calendar event as the text used for indexing."""
+    if "dateTime" in event["start"]:
+        start_time = event["start"]["dateTime"]
+    else:
+        start_time = event["start"]["date"]
+
+    if "dateTime" in event["end"]:
+        end_time = event["end"]["dateTime"]
+    else:
+        end_time = event["end"]["date"]
+
+    event_string = f"Status: {event['status']}, "
+    event_string += f"Summary: {event['summary']}, "
+    event_string += f"Start time: {start_time}, "
+    event_string += f"End time: {end_time}, "
+
+    organizer = event.get("organizer", {})
+    display_name = organizer.get("displayName", "N/A")
+    email = organizer.get("email", "N/A")
+    if display_name != "N/A":
+        event_string += f"Organizer: {display_name} ({email})"
+    else:
+        event_string += f"Organizer: {email}"
+
+    return event_string
+
 
 class GoogleCalendarReader(BaseReader):
     """Google Calendar reader.
@@ -29,72 +96,162 @@ class GoogleCalendarReader(BaseReader):
         """Load data from user's calendar.
 
         Args:
-            number_of_results (Optional[int]): the number of events to return. Defaults to 100.
+            number_of_results (Optional[int]): the number of events to return, across pages. Defaults to 100.
             start_date (Optional[Union[str, datetime.date]]): the start date to return events from. Defaults to today.
         """
-        from googleapiclient.discovery import build
-
-        events_result = None
-        if local_data_filename is None:
-            credentials = self._get_credentials()
-            service = build("calendar", "v3", credentials=credentials)
-
-            if start_date is None:
-                start_date = datetime.date.today()
-            elif isinstance(start_date, str):
-                start_date = datetime.date.fromisoformat(start_date)
-
-            start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
-            start_datetime_utc = start_datetime.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
-
-            events_result = (
-                service.events()
-                .list(
-                    calendarId="primary",
-                    timeMin=start_datetime_utc,
-                    maxResults=number_of_results,
-                    singleEvents=True,
-                    orderBy="startTime",
-                )
-                .execute()
+        return list(
+            self.lazy_load_data(
+                number_of_results=number_of_results,
+                start_date=start_date,
+                local_data_filename=local_data_filename,
             )
+        )
+
+    def lazy_load_data(
+        self,
+        number_of_results: Optional[int] = None,
+        start_date: Optional[Union[str, datetime.date]] = None,
+        local_data_filename: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[Document]:
+        """Lazily load data from user's calendar, fetching one page at a time.
+
+        Args:
+            number_of_results (Optional[int]): the number of events to return. Defaults to all of them.
+            start_date (Optional[Union[str, datetime.date]]): the start date to return events from. Defaults to today.
+            page_size (int): the number of events fetched per request.
+        """
+        for events in self.iter_event_pages(
+            number_of_results=number_of_results,
+            start_date=start_date,
+            local_data_filename=local_data_filename,
+            page_size=page_size,
+        ):
+            for event in events:
+                yield Document(text=format_event(event))
+
+    def iter_event_pages(
+        self,
+        number_of_results: Optional[int] = None,
+        start_date: Optional[Union[str, datetime.date]] = None,
+        local_data_filename: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[List[dict]]:
+        """Yield raw events ordered by start time, one page at a time.
+
+        Args:
+            number_of_results (Optional[int]): the number of events to return. Defaults to all of them.
+            start_date (Optional[Union[str, datetime.date]]): the start date to return events from. Defaults to today.
+            page_size (int): the number of events fetched per request.
+        """
+        if number_of_results is not None:
+            page_size = min(page_size, number_of_results)
+        remaining = number_of_results
+
+        params = {"timeMin": _format_time_min(start_date), "orderBy": "startTime"}
+        for events_result in self._iter_pages(params, local_data_filename, page_size):
+            events = events_result.get("items", [])
+            if remaining is not None:
+                events = events[:remaining]
+                remaining -= len(events)
+
+            if events:
+                yield events
+            if remaining == 0:
+                return
+
+    def sync_events(
+        self,
+        sync_token: Optional[str] = None,
+        start_date: Optional[Union[str, datetime.date]] = None,
+        local_data_filename: Optional[str] = None,
+    ) -> Tuple[List[dict], Optional[str]]:
+        """Fetch raw event changes from user's calendar.
+
+        Without a sync token this is a full sync of events from start_date.
+        With one, only events inserted, updated or cancelled since the token
+        was issued are returned; cancelled events have status "cancelled".
+
+        Args:
+            sync_token (Optional[str]): the nextSyncToken from a previous sync.
+            start_date (Optional[Union[str, datetime.date]]): the start date for a full sync. Defaults to today.
+
+        Returns:
+            Tuple of the raw event items and the token for the next sync.
+
+        Raises:
+            SyncTokenExpiredError: the API rejected the sync token with 410 Gone.
+        """
+        items = []
+        next_sync_token = None
+        for page, next_sync_token in self.iter_sync_pages(
+            sync_token, start_date, local_data_filename
+        ):
+            items.extend(page)
+        return items, next_sync_token
+
+    def iter_sync_pages(
+        self,
+        sync_token: Optional[str] = None,
+        start_date: Optional[Union[str, datetime.date]] = None,
+        local_data_filename: Optional[str] = None,
+    ) -> Iterator[Tuple[List[dict], Optional[str]]]:
+        """Like sync_events, but yield (items, next sync token) page by page.
+
+        The sync token is None on every page but the last.
+
+        Raises:
+            SyncTokenExpiredError: the API rejected the sync token with 410 Gone.
+        """
+        # timeMin and orderBy can't be combined with a sync token
+        if sync_token:
+            params = {"syncToken": sync_token}
         else:
-            with open(local_data_filename, "r") as file:
-                events_result = json.load(file)
+            params = {"timeMin": _format_time_min(start_date)}
 
-        events = events_result.get("items", [])
+        for events_result in self._iter_pages(params, local_data_filename):
+            yield events_result.get("items", []), events_result.get("nextSyncToken")
 
-        if not events:
-            return []
+    def _iter_pages(
+        self,
+        params: dict,
+        local_data_filename: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+    ) -> Iterator[dict]:
+        """Yield raw events().list responses, following nextPageToken."""
+        if local_data_filename is not None:
+            yield from _iter_local_pages(local_data_filename, page_size)
+            return
 
-        results = []
-        for event in events:
-            if "dateTime" in event["start"]:
-                start_time = event["start"]["dateTime"]
-            else:
-                start_time = event["start"]["date"]
+        from googleapiclient.discovery import build
+        from googleapiclient.errors import HttpError
 
-            if "dateTime" in event["end"]:
-                end_time = event["end"]["dateTime"]
-            else:
-                end_time = event["end"]["date"]
-
-            event_string = f"Status: {event['status']}, "
-            event_string += f"Summary: {event['summary']}, "
-            event_string += f"Start time: {start_time}, "
-            event_string += f"End time: {end_time}, "
-
-            organizer = event.get("organizer", {})
-            display_name = organizer.get("displayName", "N/A")
-            email = organizer.get("email", "N/A")
-            if display_name != "N/A":
-                event_string += f"Organizer: {display_name} ({email})"
-            else:
-                event_string += f"Organizer: {email}"
+        credentials = self._get_credentials()
+        service = build("calendar", "v3", credentials=credentials)
 
-            results.append(Document(text=event_string))
+        page_token = None
+        while True:
+            try:
+                events_result = (
+                    service.events()
+                    .list(
+                        calendarId="primary",
+                        singleEvents=True,
+                        maxResults=page_size,
+                        pageToken=page_token,
+                        **params,
+                    )
+                    .execute()
+                )
+            except HttpError as e:
+                if e.resp.status == 410:
+                    raise SyncTokenExpiredError(str(e)) from e
+                raise
 
-        return results
+            yield events_result
+            page_token = events_result.get("nextPageToken")
+            if not page_token:
+                return
 
     def _get_credentials(self) -> Any:
         """Get valid user credentials from storage.
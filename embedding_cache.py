@@ -0,0 +1,201 @@
+import array
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import List
+
+from dotenv import load_dotenv
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.embeddings.ollama import OllamaEmbedding
+from llama_index.embeddings.openai import OpenAIEmbedding
+
+# Load environment variables
+load_dotenv()
+
+CACHE_DB = os.path.join("data", "embedding_cache.sqlite")
+
+# Choose AI provider
+USE_OLLAMA = os.getenv("OLLAMA") == "1"
+
+# Ollama embedding configuration
+OLLAMA_EMBEDDING_CONFIG = {
+    "model_name": os.getenv("OLLAMA_MODEL", "llama3.2"),
+    "base_url": os.getenv(
+        "OLLAMA_EMBED_ENDPOINT", os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434")
+    ),
+    "ollama_additional_kwargs": {"mirostat": 0},
+}
+
+# OpenAI embedding configuration
+OPENAI_EMBEDDING_CONFIG = {
+    "model": "text-embedding-ada-002",
+    "api_key": os.getenv("OPENAI_API_KEY"),
+}
+
+
+def _hash_text(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (embedding model, text hash)."""
+
+    def __init__(self, path=CACHE_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )""")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, model, texts):
+        """Return cached embeddings for texts, with None for each miss."""
+        hashes = [_hash_text(text) for text in texts]
+        found = {}
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for i in range(0, len(hashes), 500):
+                chunk = hashes[i : i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, embedding FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *chunk],
+                )
+                for text_hash, blob in rows:
+                    found[text_hash] = array.array("f", blob).tolist()
+
+            results = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model, texts, embeddings):
+        rows = [
+            (model, _hash_text(text), array.array("f", embedding).tobytes())
+            for text, embedding in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Embedding model wrapper that only calls the provider on cache misses."""
+
+    _inner: BaseEmbedding = PrivateAttr()
+    _cache: EmbeddingCache = PrivateAttr()
+
+    def __init__(self, inner: BaseEmbedding, cache: EmbeddingCache, **kwargs):
+        super().__init__(
+            model_name=f"{inner.class_name()}:{inner.model_name}",
+            embed_batch_size=inner.embed_batch_size,
+            **kwargs,
+        )
+        self._inner = inner
+        self._cache = cache
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def cache(self) -> EmbeddingCache:
+        return self._cache
+
+    def _cached(self, texts, kind, embed_fn):
+        # Some providers embed queries differently from documents
+        model = f"{self.model_name}:{kind}"
+        results = self._cache.get_many(model, texts)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            new_embeddings = embed_fn([texts[i] for i in missing])
+            for i, embedding in zip(missing, new_embeddings):
+                results[i] = embedding
+            self._cache.put_many(model, [texts[i] for i in missing], new_embeddings)
+        return results
+
+    async def _acached(self, texts, kind, aembed_fn):
+        model = f"{self.model_name}:{kind}"
+        # SQLite calls block, and may wait on the indexer's writes
+        results = await asyncio.to_thread(self._cache.get_many, model, texts)
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            new_embeddings = await aembed_fn([texts[i] for i in missing])
+            for i, embedding in zip(missing, new_embeddings):
+                results[i] = embedding
+            await asyncio.to_thread(
+                self._cache.put_many,
+                model,
+                [texts[i] for i in missing],
+                new_embeddings,
+            )
+        return results
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        return self._cached(
+            [query],
+            "query",
+            lambda texts: [self._inner.get_query_embedding(texts[0])],
+        )[0]
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        async def aembed(texts):
+            return [await self._inner.aget_query_embedding(texts[0])]
+
+        return (await self._acached([query], "query", aembed))[0]
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> List[float]:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return self._cached(texts, "text", self._inner.get_text_embedding_batch)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await self._acached(texts, "text", self._inner.aget_text_embedding_batch)
+
+
+# One cache per process, shared by the calendar and journal indexes
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache():
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def get_embed_model():
+    """Return the configured embedding model, backed by the embedding cache."""
+    if USE_OLLAMA:
+        inner = OllamaEmbedding(**OLLAMA_EMBEDDING_CONFIG)
+    else:
+        inner = OpenAIEmbedding(**OPENAI_EMBEDDING_CONFIG)
+    return CachedEmbedding(inner, get_embedding_cache())
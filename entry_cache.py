@@ -0,0 +1,59 @@
+import os
+import threading
+from collections import OrderedDict
+
+from journal_store import get_journal_store
+
+# Entries kept in memory, shared by every chat session in the process
+ENTRY_CACHE_SIZE = int(os.getenv("ENTRY_CACHE_SIZE", "64"))
+
+
+class EntryCache:
+    """Entry texts keyed by filename, checked against the store's revision.
+
+    A hit never reads the entry itself, but looking up the revision isn't
+    free: for flat files it takes the journal log's lock, replays any records
+    other processes appended and stats the file; in SQLite it is a one-column
+    lookup. Call it from a thread, not the event loop. Every write, from this
+    process or the backend, changes the revision, so nothing needs to be
+    invalidated.
+    """
+
+    def __init__(self, max_entries=ENTRY_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # filename -> (revision, text), least recently used first
+        self._entries = OrderedDict()
+
+    def read_entry_with_revision(self, filename):
+        store = get_journal_store()
+        revision = store.revision(filename)
+        with self._lock:
+            cached = self._entries.get(filename)
+            if cached and cached[0] == revision:
+                self._entries.move_to_end(filename)
+                return cached[1], revision
+
+        text, revision = store.read_entry_with_revision(filename)
+        with self._lock:
+            self._entries[filename] = (revision, text)
+            self._entries.move_to_end(filename)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return text, revision
+
+    def read_entry(self, filename):
+        return self.read_entry_with_revision(filename)[0]
+
+
+_entry_cache = EntryCache()
+
+
+def read_entry(filename):
+    """The entry's current text, from memory unless it changed."""
+    return _entry_cache.read_entry(filename)
+
+
+def read_entry_with_revision(filename):
+    """The entry's current text and revision, from memory unless it changed."""
+    return _entry_cache.read_entry_with_revision(filename)
@@ -0,0 +1,47 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive lock shared by gunicorn workers and the Chainlit process.
+
+    Only writers lock: files are replaced atomically, so readers never need to.
+    """
+    with open(lock_path, "a") as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write_text(path, text):
+    """Write text to a temp file and rename it over path.
+
+    Readers see either the old or the new file, never a partial one.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data):
+    atomic_write_text(path, json.dumps(data))
@@ -0,0 +1,215 @@
+import asyncio
+import contextlib
+import datetime
+import math
+import re
+import threading
+from collections import Counter
+
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.schema import NodeWithScore
+
+TOKEN_RE = re.compile(r"\w+")
+FILENAME_DATE_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by did do for from had has have how i if in is it "
+    "its me my of on or so that the their there they this to was we were what "
+    "when where which who why will with you your".split()
+)
+
+# Standard Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Reciprocal rank fusion constant; larger values flatten the rank weighting
+RRF_K = 60
+
+
+def tokenize(text):
+    return [
+        token for token in TOKEN_RE.findall(text.casefold()) if token not in STOPWORDS
+    ]
+
+
+def entry_date(filename):
+    """The date of an entry from its YYYY-MM-DD filename prefix, or None."""
+    match = FILENAME_DATE_RE.match(filename)
+    if not match:
+        return None
+    try:
+        return datetime.date.fromisoformat(match.group(1))
+    except ValueError:
+        return None
+
+
+class BM25Index:
+    """Pure-Python inverted index over journal chunks, updated entry by entry."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # term -> node ids containing it
+        self._postings = {}
+        # node id -> term frequencies, and its length in terms
+        self._node_terms = {}
+        self._node_lengths = {}
+        # entry filename -> its node ids
+        self._file_nodes = {}
+        self._total_length = 0
+
+    def add(self, filename, nodes):
+        """Index an entry's chunks, replacing any previously indexed ones."""
+        with self._lock:
+            self._remove(filename)
+            self._file_nodes[filename] = []
+            for node in nodes:
+                tokens = tokenize(node.get_content())
+                terms = Counter(tokens)
+                self._node_terms[node.node_id] = terms
+                self._node_lengths[node.node_id] = len(tokens)
+                self._total_length += len(tokens)
+                self._file_nodes[filename].append(node.node_id)
+                for term in terms:
+                    self._postings.setdefault(term, set()).add(node.node_id)
+
+    def remove(self, filename):
+        with self._lock:
+            self._remove(filename)
+
+    def _remove(self, filename):
+        for node_id in self._file_nodes.pop(filename, []):
+            terms = self._node_terms.pop(node_id)
+            self._total_length -= self._node_lengths.pop(node_id)
+            for term in terms:
+                postings = self._postings[term]
+                postings.discard(node_id)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query, top_k, node_ids=None):
+        """Return up to top_k (node id, score) pairs, best first.
+
+        With node_ids, only those nodes are considered.
+        """
+        with self._lock:
+            node_count = len(self._node_terms)
+            if not node_count:
+                return []
+            average_length = self._total_length / node_count
+
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(
+                    1 + (node_count - len(postings) + 0.5) / (len(postings) + 0.5)
+                )
+                for node_id in postings:
+                    if node_ids is not None and node_id not in node_ids:
+                        continue
+                    tf = self._node_terms[node_id][term]
+                    length = self._node_lengths[node_id]
+                    scores[node_id] += (
+                        idf
+                        * tf
+                        * (BM25_K1 + 1)
+                        / (
+                            tf
+                            + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                        )
+                    )
+        return scores.most_common(top_k)
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse ranked lists of node ids into one list of (node id, score)."""
+    scores = Counter()
+    for ranking in rankings:
+        for rank, node_id in enumerate(ranking, start=1):
+            scores[node_id] += 1 / (k + rank)
+    return scores.most_common()
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuses vector and BM25 results over journal chunks.
+
+    Both retrievers return candidate_k chunks, restricted to node_ids when
+    given, and the top_k best after reciprocal rank fusion are kept. The
+    query is embedded first; both searches then run under lock, so the
+    indexer can't change the index or the BM25 index halfway through.
+    """
+
+    def __init__(
+        self,
+        index,
+        keyword_index,
+        embed_model,
+        top_k,
+        candidate_k,
+        node_ids=None,
+        lock=None,
+    ):
+        super().__init__()
+        self._index = index
+        self._keyword_index = keyword_index
+        self._embed_model = embed_model
+        self._top_k = top_k
+        self._node_ids = node_ids
+        self._lock = lock or contextlib.nullcontext()
+        self._vector_retriever = VectorIndexRetriever(
+            index, similarity_top_k=candidate_k, node_ids=node_ids
+        )
+        self._candidate_k = candidate_k
+
+    def _keyword_results(self, query_str):
+        node_ids = set(self._node_ids) if self._node_ids is not None else None
+        return self._keyword_index.search(query_str, self._candidate_k, node_ids)
+
+    def _fuse(self, vector_results, keyword_results):
+        nodes = {result.node.node_id: result.node for result in vector_results}
+        missing = [node_id for node_id, _ in keyword_results if node_id not in nodes]
+        for node in self._index.docstore.get_nodes(missing, raise_error=False):
+            if node is not None:
+                nodes[node.node_id] = node
+
+        fused = reciprocal_rank_fusion(
+            [
+                [result.node.node_id for result in vector_results],
+                [node_id for node_id, _ in keyword_results],
+            ]
+        )
+        return [
+            NodeWithScore(node=nodes[node_id], score=score)
+            for node_id, score in fused
+            if node_id in nodes
+        ][: self._top_k]
+
+    def _search(self, query_bundle):
+        # The query is already embedded, so nothing slow happens under the lock
+        with self._lock:
+            vector_results = self._vector_retriever.retrieve(query_bundle)
+            return self._fuse(
+                vector_results, self._keyword_results(query_bundle.query_str)
+            )
+
+    def _retrieve(self, query_bundle):
+        if self._node_ids is not None and not self._node_ids:
+            return []
+        if query_bundle.embedding is None:
+            query_bundle.embedding = self._embed_model.get_agg_embedding_from_queries(
+                query_bundle.embedding_strs
+            )
+        return self._search(query_bundle)
+
+    async def _aretrieve(self, query_bundle):
+        if self._node_ids is not None and not self._node_ids:
+            return []
+        if query_bundle.embedding is None:
+            query_bundle.embedding = (
+                await self._embed_model.aget_agg_embedding_from_queries(
+                    query_bundle.embedding_strs
+                )
+            )
+        # Waiting for the lock would block the event loop
+        return await asyncio.to_thread(self._search, query_bundle)
@@ -0,0 +1,107 @@
+import json
+import re
+
+HEADING_RE = re.compile(r"^#{1,6}\s")
+
+EDIT_OPS = ("replace", "insert", "append_section")
+
+
+class EditError(ValueError):
+    """The model's edits can't be parsed or don't apply to the entry."""
+
+
+def split_sections(text):
+    """Split a markdown entry into sections, each starting at a heading.
+
+    Text before the first heading is a section of its own. Joining the
+    sections gives back the original text, so untouched sections are kept
+    byte for byte. Headings inside code fences don't start a section.
+    """
+    sections = []
+    current = []
+    in_fence = False
+    for line in text.splitlines(keepends=True):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        if not in_fence and HEADING_RE.match(line) and "".join(current).strip():
+            sections.append("".join(current))
+            current = []
+        current.append(line)
+    if "".join(current).strip():
+        sections.append("".join(current))
+    elif current and sections:
+        sections[-1] += "".join(current)
+    return sections
+
+
+def render_sections(sections):
+    """Number the sections for the prompt; edits refer to these numbers."""
+    return "\n\n".join(
+        f"[{number}]\n{section.strip()}"
+        for number, section in enumerate(sections, start=1)
+    )
+
+
+def parse_edits(response_text):
+    """Parse the {"edits": [...]} object the model was asked for.
+
+    A bare list of edits and a surrounding ```json fence are also accepted.
+    """
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", response_text, re.DOTALL)
+    if match:
+        response_text = match.group(1)
+    try:
+        edits = json.loads(response_text)
+    except json.JSONDecodeError as e:
+        raise EditError(f"Edits are not valid JSON: {e}") from e
+
+    if isinstance(edits, dict):
+        edits = edits.get("edits")
+    if not isinstance(edits, list):
+        raise EditError("Expected a list of edits")
+
+    for edit in edits:
+        if not isinstance(edit, dict) or edit.get("op") not in EDIT_OPS:
+            raise EditError(f"Unknown edit: {edit!r}")
+        if not isinstance(edit.get("text"), str):
+            raise EditError(f"Edit has no text: {edit!r}")
+    return edits
+
+
+def _trailing_whitespace(section):
+    return section[len(section.rstrip()) :]
+
+
+def apply_edits(text, edits):
+    """Apply section-addressed edits to an entry and return the new entry.
+
+    Section numbers refer to the entry as it was sent to the model, so the
+    order of the edits doesn't shift the sections they address.
+    """
+    sections = split_sections(text)
+    appended = []
+
+    for edit in edits:
+        if edit["op"] == "append_section":
+            appended.append(edit["text"].strip())
+            continue
+
+        number = edit.get("section")
+        if isinstance(number, str) and number.isdigit():
+            number = int(number)
+        if not isinstance(number, int) or not 1 <= number <= len(sections):
+            raise EditError(f"Edit addresses an unknown section: {edit!r}")
+        section = sections[number - 1]
+        # Keep the blank lines that separated the section from the next one
+        trailing = _trailing_whitespace(section) or "\n\n"
+        new_text = edit["text"].strip()
+
+        if edit["op"] == "replace":
+            sections[number - 1] = new_text + trailing if new_text else ""
+        elif new_text:
+            sections[number - 1] = section.rstrip() + "\n\n" + new_text + trailing
+
+    updated = "".join(sections).rstrip()
+    for section in appended:
+        updated += "\n\n" + section
+    return updated.strip()
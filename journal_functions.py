@@ -1,14 +1,143 @@
 import os
 import requests
-import chainlit as cl
 import asyncio
-from serpapi import GoogleSearch
-from llama_index.core import VectorStoreIndex, SimpleDirectoryReader, Settings
-from llama_index.embeddings.ollama import OllamaEmbedding
-from llama_index.embeddings.openai import OpenAIEmbedding
+import datetime
+import httpx
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from llama_index.core import Settings
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.utils import get_tokenizer
+from calendar_utils import calendar_index_manager
+from embedding_cache import get_embed_model
+from journal_index import get_journal_retriever, start_background_indexer
+from response_cache import cached
+
+SERPAPI_URL = "https://serpapi.com/search.json"
+SERPAPI_TIMEOUT = float(os.getenv("SERPAPI_TIMEOUT", "10"))
+
+# SerpAPI takes its key as a query parameter; keep request URLs out of the logs
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+# Work that has no async API runs here, off the event loop, so one slow tool
+# doesn't stall every other session. Bounded so a burst can't spawn threads.
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", "4"))
+_executor = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+
+async def run_blocking(func, *args):
+    """Run a blocking call on the bounded tool executor."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, func, *args)
+
+
+# Return retrieved chunks to the conversation model instead of having the
+# tools synthesize an answer with an LLM call of their own
+RETRIEVAL_ONLY = os.getenv("RETRIEVAL_ONLY", "1") == "1"
+
+# Tokens of retrieved context a single tool call may return
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1500"))
+
+# Calendar events handed back per search in retrieval-only mode
+CALENDAR_SEARCH_TOP_K = int(os.getenv("CALENDAR_SEARCH_TOP_K", "5"))
+
+
+def format_retrieved(title, results, token_budget=CONTEXT_TOKEN_BUDGET):
+    """Format retrieved nodes with their scores, best first, within a token budget.
+
+    Nodes that would overflow the budget are dropped, except the first, which
+    is cut short so there is always something to go on.
+    """
+    count_tokens = get_tokenizer()
+    formatted = f"{title}\n\n"
+    remaining = token_budget - len(count_tokens(formatted))
+
+    for i, result in enumerate(results):
+        source = result.node.metadata.get("file_name")
+        label = (
+            f"[{source}, score {result.score:.3f}]"
+            if source
+            else f"[score {result.score:.3f}]"
+        )
+        chunk = f"{label}\n{result.node.get_content().strip()}\n\n"
+        tokens = len(count_tokens(chunk))
+        if tokens > remaining:
+            if i == 0 and remaining > 0:
+                formatted += chunk[: len(chunk) * remaining // tokens] + "...\n\n"
+            break
+        formatted += chunk
+        remaining -= tokens
+
+    if not results:
+        formatted += "Nothing relevant was found.\n"
+    return formatted.strip()
+
+
+# Tool definitions for native tool calling, matching the functions below
+TOOLS = [
+    {
+        "type": "function",
+        "function": {
+            "name": "get_top_news",
+            "description": "Get today's top news headlines. Use when the user asks about current events or news.",
+            "parameters": {"type": "object", "properties": {}},
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "journal_search",
+            "description": "Search the user's past journal entries. Use for any question about past entries or experiences.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "What to look for, e.g. 'Have I talked about hunger?'",
+                    },
+                    "start_date": {
+                        "type": "string",
+                        "description": "Only search entries from this date on, as YYYY-MM-DD.",
+                    },
+                    "end_date": {
+                        "type": "string",
+                        "description": "Only search entries up to this date, as YYYY-MM-DD.",
+                    },
+                },
+                "required": ["query"],
+            },
+        },
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "calendar_search",
+            "description": "Search the user's calendar events and scheduled activities.",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {
+                        "type": "string",
+                        "description": "What to look for, e.g. 'When did I last go for a run?'",
+                    }
+                },
+                "required": ["query"],
+            },
+        },
+    },
+]
 
 
 async def get_top_news():
+    # SerpAPI calls are paid for, so headlines are reused for a few minutes
+    try:
+        return await cached("get_top_news", "", _fetch_top_news)
+    except httpx.HTTPError as e:
+        # The message would include the request URL, and with it the API key
+        print(f"Error fetching top news: {type(e).__name__}")
+        return "Top news is unavailable at the moment."
+
+
+async def _fetch_top_news():
     # Set up parameters for the API call
     params = {
         "api_key": os.getenv("SERP_API_KEY"),
@@ -21,8 +150,10 @@ async def get_top_news():
     }
 
     # Perform the API search
-    search = GoogleSearch(params)
-    results = search.get_dict()
+    async with httpx.AsyncClient(timeout=SERPAPI_TIMEOUT) as client:
+        response = await client.get(SERPAPI_URL, params=params)
+        response.raise_for_status()
+        results = response.json()
 
     # Check if 'news_results' are present in the API response
     if "news_results" not in results:
@@ -49,45 +180,67 @@ async def get_top_news():
     return formatted_news
 
 
-async def journal_search(query):
-    documents = SimpleDirectoryReader("data").load_data()
+def start_journal_indexer():
+    start_background_indexer(get_embed_model())
 
-    if USE_OLLAMA:
-        ollama_embedding = OllamaEmbedding(**OLLAMA_EMBEDDING_CONFIG)
-        Settings.embed_model = ollama_embedding
-    else:
-        openai_embedding = OpenAIEmbedding(**OPENAI_EMBEDDING_CONFIG)
-        Settings.embed_model = openai_embedding
 
-    # Create an index from the documents
-    index = VectorStoreIndex.from_documents(documents)
+async def _embed_query(query):
+    return await get_embed_model().aget_query_embedding(query)
+
+
+async def journal_search(query, start_date=None, end_date=None):
+    try:
+        start = datetime.date.fromisoformat(start_date) if start_date else None
+        end = datetime.date.fromisoformat(end_date) if end_date else None
+    except ValueError:
+        return "Dates must be given as YYYY-MM-DD."
+
+    if start or end:
+        # Similar queries over different date ranges aren't interchangeable
+        key = f"{query} [{start or ''}..{end or ''}]"
+        return await cached(
+            "journal_search", key, lambda: _query_journal(query, start, end)
+        )
+    return await cached(
+        "journal_search", query, lambda: _query_journal(query), _embed_query
+    )
 
-    # Create a query engine
-    query_engine = index.as_query_engine()
 
-    # Example query
-    response = query_engine.query(query)
+async def _query_journal(query, start_date=None, end_date=None):
+    embed_model = get_embed_model()
+    Settings.embed_model = embed_model
+
+    # Load the persisted index, re-embedding only new or changed entries.
+    # That may block on the index lock or embedding calls, so keep it off the loop.
+    retriever = await run_blocking(
+        get_journal_retriever, embed_model, start_date, end_date
+    )
+
+    if RETRIEVAL_ONLY:
+        results = await retriever.aretrieve(query)
+        return format_retrieved(f"Journal excerpts for '{query}':", results)
+
+    # Keyword and vector matches are fused, so only the best few chunks
+    # reach the LLM
+    query_engine = RetrieverQueryEngine.from_args(retriever)
+
+    response = await query_engine.aquery(query)
     print(f"journal_search: {response}")
 
     return response
 
 
 async def calendar_search(query):
-    calendar_index = cl.user_session.get("calendar_index")
+    calendar_index = calendar_index_manager.index
 
     if calendar_index:
         try:
-            query_engine = calendar_index.as_query_engine()
-            query_result = query_engine.query(query)
-
-            # Format the response
-            formatted_response = (
-                f"Calendar search results for '{query}':\n\n{query_result.response}"
+            return await cached(
+                "calendar_search",
+                query,
+                lambda: _query_calendar(calendar_index, query),
+                _embed_query,
             )
-
-            print("Response from calendar_search:")
-            print(formatted_response)
-            return formatted_response
         except Exception as e:
             print(f"Error querying calendar index: {e}")
             error_message = (
@@ -100,16 +253,20 @@ async def calendar_search(query):
         return "Calendar information is unavailable."
 
 
-# Add these configurations at the top of the file
-USE_OLLAMA = os.getenv("OLLAMA") == "1"
+async def _query_calendar(calendar_index, query):
+    if RETRIEVAL_ONLY:
+        retriever = calendar_index.as_retriever(similarity_top_k=CALENDAR_SEARCH_TOP_K)
+        results = await retriever.aretrieve(query)
+        return format_retrieved(f"Calendar events matching '{query}':", results)
+
+    query_engine = calendar_index.as_query_engine()
+    query_result = await query_engine.aquery(query)
 
-OLLAMA_EMBEDDING_CONFIG = {
-    "model_name": os.getenv("OLLAMA_MODEL", "llama3.2"),
-    "base_url": os.getenv("OLLAMA_ENDPOINT", "http://localhost:11434"),
-    "ollama_additional_kwargs": {"mirostat": 0},
-}
+    # Format the response
+    formatted_response = (
+        f"Calendar search results for '{query}':\n\n{query_result.response}"
+    )
 
-OPENAI_EMBEDDING_CONFIG = {
-    "model": "text-embedding-ada-002",
-    "api_key": os.getenv("OPENAI_API_KEY"),
-}
+    print("Response from calendar_search:")
+    print(formatted_response)
+    return formatted_response
@@ -0,0 +1,398 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from embedding_cache import get_embedding_cache
+from file_utils import atomic_write_json
+from hybrid_retriever import BM25Index, HybridRetriever, entry_date
+from journal_store import get_journal_store
+from response_cache import invalidate as invalidate_responses
+from llama_index.core import (
+    Document,
+    Settings,
+    StorageContext,
+    VectorStoreIndex,
+    load_index_from_storage,
+)
+from llama_index.core.indices.utils import embed_nodes
+from llama_index.core.ingestion import run_transformations
+
+# Journal entries live in data/, the persisted index right next to them
+JOURNAL_DIR = "data"
+INDEX_DIR = os.path.join(JOURNAL_DIR, "journal_index")
+MANIFEST_FILE = os.path.join(INDEX_DIR, "manifest.json")
+
+# Wait for autosaves to settle before re-embedding, but never longer than the max
+DEBOUNCE_SECONDS = float(os.getenv("JOURNAL_INDEX_DEBOUNCE", "3"))
+MAX_DELAY_SECONDS = 15
+
+# Entries that failed to index, say with the embedder unreachable, are retried
+RETRY_SECONDS = 30
+
+# Chunks handed to the LLM per search, and candidates taken from each retriever
+SEARCH_TOP_K = int(os.getenv("JOURNAL_SEARCH_TOP_K", "3"))
+SEARCH_CANDIDATE_K = int(os.getenv("JOURNAL_SEARCH_CANDIDATE_K", "10"))
+
+# What _apply_update changed: an entry's chunks, or only its manifest version
+CONTENT_CHANGED = "content"
+VERSION_CHANGED = "version"
+
+# One index per process, guarded by a lock since Chainlit may run tools concurrently
+_index = None
+_manifest = None
+_keyword_index = None
+_lock = threading.Lock()
+
+# Background indexer state: filename -> (first scheduled, due time)
+_embed_model = None
+_pending = {}
+_pending_cond = threading.Condition()
+_indexer_thread = None
+
+
+def _hash_content(content):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _embed_model_key(embed_model):
+    return f"{embed_model.class_name()}:{embed_model.model_name}"
+
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _save(index, manifest, content_changed):
+    """Persist the manifest, and the index itself if any entry's content changed.
+
+    Rewriting the vector store and docstore costs as much as the whole
+    journal, so entries whose version changed without their text (the
+    compactor moving an edit from the log into the .md file, say) only
+    touch the manifest.
+    """
+    if content_changed:
+        index.storage_context.persist(persist_dir=INDEX_DIR)
+    atomic_write_json(MANIFEST_FILE, manifest)
+    if content_changed:
+        # The index changed, so cached search results may be out of date
+        invalidate_responses("journal_search")
+
+
+def _load_index(embed_model):
+    model_key = _embed_model_key(embed_model)
+    manifest = _load_manifest()
+
+    # Vectors from a different embedding model can't be reused, so start over
+    if manifest and manifest.get("embed_model") == model_key:
+        try:
+            storage_context = StorageContext.from_defaults(persist_dir=INDEX_DIR)
+            index = load_index_from_storage(storage_context, embed_model=embed_model)
+            return index, manifest
+        except Exception as e:
+            print(f"Error loading journal index, rebuilding: {e}")
+
+    index = VectorStoreIndex([], embed_model=embed_model)
+    return index, {"embed_model": model_key, "entries": {}}
+
+
+def _build_keyword_index(index):
+    """Rebuild the BM25 index from the chunks already in the docstore."""
+    keyword_index = BM25Index()
+    for filename, ref_doc_info in index.ref_doc_info.items():
+        keyword_index.add(filename, index.docstore.get_nodes(ref_doc_info.node_ids))
+    return keyword_index
+
+
+def _make_document(filename, content, content_hash):
+    return Document(
+        text=content,
+        doc_id=filename,
+        metadata={"file_name": filename, "content_hash": content_hash},
+        excluded_embed_metadata_keys=["content_hash"],
+        excluded_llm_metadata_keys=["content_hash"],
+    )
+
+
+def _prepare_update(entry, filename, version, embed_model):
+    """Work out how to bring one entry up to date, doing the slow parts.
+
+    entry is the entry's manifest entry, version its version in the journal
+    store, None if it is gone. Reads the entry and, if its text changed,
+    splits and embeds it, so no lock needs to be held. Returns None if the
+    entry is current, otherwise (manifest entry, document, nodes) for
+    _apply_update: the manifest entry is None if the entry is gone, and
+    nodes is None if only its version changed.
+    """
+    if version is not None and entry and entry.get("version") == version:
+        # An unchanged version means we can skip reading the entry at all
+        return None
+
+    content = None
+    if version is not None:
+        try:
+            content = get_journal_store().read_entry(filename)
+        except FileNotFoundError:
+            pass
+    if content is None:
+        return (None, None, []) if entry else None
+
+    content_hash = _hash_content(content)
+    new_entry = {"hash": content_hash, "version": version}
+    if entry and entry["hash"] == content_hash:
+        return new_entry, None, None
+
+    document = _make_document(filename, content, content_hash)
+    nodes = []
+    if content.strip():
+        nodes = run_transformations([document], Settings.transformations)
+        embeddings = embed_nodes(nodes, embed_model)
+        for node in nodes:
+            node.embedding = embeddings[node.node_id]
+    return new_entry, document, nodes
+
+
+def _apply_update(index, keyword_index, entries, filename, update):
+    """Swap a prepared update into the index; nothing here calls the embedder.
+
+    Returns CONTENT_CHANGED if the entry's chunks changed, VERSION_CHANGED if
+    only its manifest entry did.
+    """
+    new_entry, document, nodes = update
+    if nodes is not None:
+        if filename in entries:
+            index.delete_ref_doc(filename, delete_from_docstore=True)
+            keyword_index.remove(filename)
+        if nodes:
+            index.insert_nodes(nodes)
+            index.docstore.set_document_hash(filename, document.hash)
+            keyword_index.add(filename, nodes)
+
+    if new_entry is None:
+        entries.pop(filename, None)
+    else:
+        entries[filename] = new_entry
+    return VERSION_CHANGED if nodes is None else CONTENT_CHANGED
+
+
+def _sync(index, keyword_index, manifest, embed_model):
+    """Re-embed new or changed entries and drop deleted ones, all in one go.
+
+    Returns the set of changes, as returned by _apply_update.
+    """
+    entries = manifest["entries"]
+    versions = get_journal_store().versions()
+
+    changes = set()
+    for filename in set(versions) | set(entries):
+        update = _prepare_update(
+            entries.get(filename), filename, versions.get(filename), embed_model
+        )
+        if update is not None:
+            changes.add(_apply_update(index, keyword_index, entries, filename, update))
+    return changes
+
+
+def _ensure_loaded(embed_model):
+    global _index, _manifest, _keyword_index
+
+    if _index is None or _manifest["embed_model"] != _embed_model_key(embed_model):
+        _index, _manifest = _load_index(embed_model)
+        _keyword_index = _build_keyword_index(_index)
+
+
+def _ensure_current(embed_model):
+    # Once the background indexer is running, queries are served from the
+    # index as-is and never pay for embedding; otherwise it is synced first
+    _ensure_loaded(embed_model)
+    if _indexer_thread is not None:
+        return
+
+    changes = _sync(_index, _keyword_index, _manifest, embed_model)
+    if changes:
+        _save(_index, _manifest, CONTENT_CHANGED in changes)
+
+
+def get_journal_index(embed_model):
+    """Return the process-wide journal index."""
+    with _lock:
+        _ensure_current(embed_model)
+        return _index
+
+
+def get_journal_retriever(embed_model, start_date=None, end_date=None):
+    """Return a hybrid BM25 and vector retriever over the journal.
+
+    With start_date or end_date, only entries whose YYYY-MM-DD filename prefix
+    falls in the range are searched; entries without a date are left out.
+    """
+    with _lock:
+        _ensure_current(embed_model)
+
+        node_ids = None
+        if start_date or end_date:
+            node_ids = []
+            for filename, ref_doc_info in _index.ref_doc_info.items():
+                date = entry_date(filename)
+                if date is None:
+                    continue
+                if start_date and date < start_date or end_date and date > end_date:
+                    continue
+                node_ids.extend(ref_doc_info.node_ids)
+
+        # Queries take the same lock, so the indexer can't change what they read
+        return HybridRetriever(
+            _index,
+            _keyword_index,
+            embed_model,
+            SEARCH_TOP_K,
+            SEARCH_CANDIDATE_K,
+            node_ids,
+            lock=_lock,
+        )
+
+
+def schedule_update(filename):
+    """Queue an entry for re-indexing once its writes have settled."""
+    if not filename.endswith(".md"):
+        return
+
+    now = time.monotonic()
+    with _pending_cond:
+        first_scheduled, _ = _pending.get(filename, (now, None))
+        due = min(now + DEBOUNCE_SECONDS, first_scheduled + MAX_DELAY_SECONDS)
+        _pending[filename] = (first_scheduled, due)
+        _pending_cond.notify()
+
+
+def _take_due_updates():
+    with _pending_cond:
+        while True:
+            now = time.monotonic()
+            due = [f for f, (_, due_at) in _pending.items() if due_at <= now]
+            if due:
+                for filename in due:
+                    del _pending[filename]
+                return due
+
+            timeout = None
+            if _pending:
+                timeout = min(due_at for _, due_at in _pending.values()) - now
+            _pending_cond.wait(timeout)
+
+
+def _schedule_retry(filenames):
+    """Queue entries again after a failed update, unless already queued."""
+    now = time.monotonic()
+    with _pending_cond:
+        for filename in filenames:
+            _pending.setdefault(filename, (now, now + RETRY_SECONDS))
+        _pending_cond.notify()
+
+
+def _update_entries(filenames):
+    """Bring entries up to date without blocking searches on the embedder.
+
+    Entries are read and embedded without the lock; only swapping the
+    results into the index holds it. Once the indexer runs it is the only
+    thread changing the index, so saving it needs no lock either.
+    """
+    with _lock:
+        _ensure_loaded(_embed_model)
+        index, keyword_index, manifest = _index, _keyword_index, _manifest
+        entries = dict(manifest["entries"])
+
+    versions = get_journal_store().versions()
+    updates = {}
+    for filename in filenames:
+        update = _prepare_update(
+            entries.get(filename), filename, versions.get(filename), _embed_model
+        )
+        if update is not None:
+            updates[filename] = update
+    if not updates:
+        return
+
+    with _lock:
+        if _index is not index:
+            return  # Reloaded for another embedding model, which starts over
+        changes = {
+            _apply_update(index, keyword_index, manifest["entries"], filename, update)
+            for filename, update in updates.items()
+        }
+
+    _save(index, manifest, CONTENT_CHANGED in changes)
+    print(
+        f"Journal index updated: {', '.join(updates)} "
+        f"(embedding cache: {get_embedding_cache().stats()})"
+    )
+
+
+def _run_indexer():
+    # Catch up on edits made while the app wasn't running, then follow updates
+    try:
+        with _lock:
+            _ensure_loaded(_embed_model)
+        filenames = _changed_entries()
+    except Exception as e:
+        print(f"Error loading journal index: {e}")
+        filenames = []
+
+    while True:
+        if filenames:
+            try:
+                _update_entries(filenames)
+            except Exception as e:
+                print(
+                    f"Error updating journal index, retrying in {RETRY_SECONDS}s: {e}"
+                )
+                _schedule_retry(filenames)
+        filenames = _take_due_updates()
+
+
+def _changed_entries():
+    """Entries whose version in the journal store differs from the index's."""
+    indexed = dict(_manifest["entries"]) if _manifest else {}
+    versions = get_journal_store().versions()
+    return [
+        filename
+        for filename in set(versions) | set(indexed)
+        if versions.get(filename) != indexed.get(filename, {}).get("version")
+    ]
+
+
+def _run_watcher():
+    try:
+        from watchfiles import watch
+    except ImportError:
+        print("watchfiles is not installed, journal index relies on write hooks")
+        return
+
+    # Entries are also written by the Flask backend, a separate process,
+    # so watching the store's files is the only way to hear about those writes
+    store = get_journal_store()
+    for _ in watch(*store.watch_paths, watch_filter=store.is_change, recursive=False):
+        for filename in _changed_entries():
+            schedule_update(filename)
+
+
+def start_background_indexer(embed_model):
+    """Keep the journal index fresh from a watcher thread and write hooks."""
+    global _embed_model, _indexer_thread
+
+    with _lock:
+        _embed_model = embed_model
+        if _indexer_thread is not None:
+            return
+
+        _indexer_thread = threading.Thread(
+            target=_run_indexer, name="journal-indexer", daemon=True
+        )
+        _indexer_thread.start()
+
+    threading.Thread(target=_run_watcher, name="journal-watcher", daemon=True).start()
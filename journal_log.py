@@ -0,0 +1,460 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+from file_utils import atomic_write_json, atomic_write_text, file_lock
+
+JOURNAL_DIR = "data"
+
+# Appends from concurrent writers within this window share one fsync
+GROUP_COMMIT_SECONDS = float(os.getenv("JOURNAL_GROUP_COMMIT_MS", "5")) / 1000
+
+# How often logged edits are folded into the .md files
+COMPACT_SECONDS = float(os.getenv("JOURNAL_COMPACT_SECONDS", "30"))
+
+
+class RevisionConflict(Exception):
+    """The entry changed since the revision an edit was based on."""
+
+    def __init__(self, revision):
+        super().__init__(f"Entry is at revision {revision}")
+        self.revision = revision
+
+
+def revision_of(text):
+    """An entry's revision: a short hash of its text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+class JournalLog:
+    """Append-only log of journal edits over the .md files in a directory.
+
+    Every write appends one JSON line to the active log segment: the entry's
+    full text, or a delta checked against the hash of the text it applies to.
+    The .md files are snapshots, and readers see them with the edits logged
+    since replayed on top. Compaction seals the active segment, writes the
+    affected .md files atomically and moves the sealed segment to history/.
+
+    Replaying is idempotent, so a crash in the middle of compaction only
+    means some edits are replayed onto snapshots that already contain them,
+    where the hash check skips them. Writers in every process serialize on
+    a lock file; readers never lock.
+    """
+
+    def __init__(self, journal_dir=JOURNAL_DIR):
+        self.journal_dir = journal_dir
+        self.log_dir = os.path.join(journal_dir, "journal_log")
+        self.history_dir = os.path.join(self.log_dir, "history")
+        self.state_file = os.path.join(self.log_dir, "state.json")
+        self.lock_file = os.path.join(self.log_dir, "journal_log.lock")
+        os.makedirs(self.history_dir, exist_ok=True)
+
+        self._lock = threading.RLock()
+        # filename -> (text, revision, last segment that changed it)
+        self._overlays = {}
+        # segment -> bytes of it already replayed
+        self._positions = {}
+        # filename -> (mtime, size, revision) of .md files already hashed
+        self._snapshot_revisions = {}
+        self._compacted = 0
+        self._state_mtime = None
+        self._active = 1
+
+        # Group commit: appends are numbered, and one leader fsyncs for all
+        self._commit_cond = threading.Condition()
+        self._appended = 0
+        self._durable = 0
+        self._committing = False
+        self._unsynced_paths = set()
+
+        self._compactor = None
+
+    def _segment_path(self, segment):
+        return os.path.join(self.log_dir, f"{segment:06d}.log")
+
+    def _read_state(self):
+        try:
+            mtime = os.stat(self.state_file).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime == self._state_mtime:
+            return
+        try:
+            with open(self.state_file, "r") as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self._state_mtime = mtime
+        self._active = state["active"]
+
+        if state["compacted"] > self._compacted:
+            # Those edits are in the .md files now; keep later ones only
+            self._compacted = state["compacted"]
+            self._overlays = {
+                filename: overlay
+                for filename, overlay in self._overlays.items()
+                if overlay[2] > self._compacted
+            }
+            self._positions = {
+                segment: position
+                for segment, position in self._positions.items()
+                if segment > self._compacted
+            }
+
+    def _write_state(self):
+        atomic_write_json(
+            self.state_file, {"compacted": self._compacted, "active": self._active}
+        )
+        self._state_mtime = os.stat(self.state_file).st_mtime_ns
+
+    def _snapshot(self, filename):
+        try:
+            with open(os.path.join(self.journal_dir, filename), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _current(self, filename):
+        overlay = self._overlays.get(filename)
+        if overlay:
+            return overlay[0]
+        return self._snapshot(filename)
+
+    def _apply(self, record, segment):
+        filename = record["file"]
+        text = self._current(filename)
+        if "content" in record:
+            text = record["content"]
+        else:
+            # Skip deltas the text already contains, or that were made
+            # against a version this text isn't
+            if text is None or revision_of(text) != record["base"]:
+                return
+            text = text[: record["start"]] + record["text"] + text[record["end"] :]
+        self._overlays[filename] = (text, record["hash"], segment)
+
+    def _catch_up(self):
+        """Replay whatever other writers have logged since the last call."""
+        self._read_state()
+        for segment in range(self._compacted + 1, self._active + 1):
+            path = self._segment_path(segment)
+            position = self._positions.get(segment, 0)
+            try:
+                if os.stat(path).st_size == position:
+                    continue
+                with open(path, "rb") as f:
+                    f.seek(position)
+                    data = f.read()
+            except FileNotFoundError:
+                continue
+
+            # A torn final line from a crashed writer is left for later
+            complete = data[: data.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                try:
+                    self._apply(json.loads(line), segment)
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+            self._positions[segment] = position + len(complete)
+
+    def _append(self, record):
+        """Append a record under the write lock; returns its commit ticket."""
+        path = self._segment_path(self._active)
+        line = json.dumps(record).encode("utf-8") + b"\n"
+        fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # Terminate a line torn by a crashed writer so ours stays whole
+            size = os.fstat(fd).st_size
+            if size and os.pread(fd, 1, size - 1) != b"\n":
+                line = b"\n" + line
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+        self._apply(record, self._active)
+        self._positions[self._active] = os.stat(path).st_size
+        with self._commit_cond:
+            self._appended += 1
+            self._unsynced_paths.add(path)
+            return self._appended
+
+    def _wait_durable(self, ticket):
+        """Return once the append with this ticket is fsynced.
+
+        The first waiter leads: it waits a moment so concurrent appends can
+        join, then fsyncs once for all of them.
+        """
+        with self._commit_cond:
+            while self._durable < ticket:
+                if not self._committing:
+                    self._committing = True
+                    break
+                self._commit_cond.wait()
+            else:
+                return
+
+        target = None
+        try:
+            time.sleep(GROUP_COMMIT_SECONDS)
+            with self._commit_cond:
+                target = self._appended
+                paths, self._unsynced_paths = self._unsynced_paths, set()
+            for path in paths:
+                try:
+                    fd = os.open(path, os.O_RDONLY)
+                except FileNotFoundError:
+                    continue  # Sealed and archived; compaction synced it
+                try:
+                    os.fsync(fd)
+                finally:
+                    os.close(fd)
+        except BaseException:
+            with self._commit_cond:
+                self._unsynced_paths |= paths if target is not None else set()
+            target = None
+            raise
+        finally:
+            with self._commit_cond:
+                self._committing = False
+                if target is not None:
+                    self._durable = max(self._durable, target)
+                self._commit_cond.notify_all()
+
+    def _write(self, filename, make_record, base_revision):
+        with self._lock:
+            with file_lock(self.lock_file):
+                self._read_state()
+                self._catch_up()
+                current = self._current(filename)
+                if current is None:
+                    raise FileNotFoundError(filename)
+                revision = revision_of(current)
+                if base_revision is not None and base_revision != revision:
+                    raise RevisionConflict(revision)
+
+                record = make_record(current, revision)
+                if record is None:
+                    return revision
+                ticket = self._append(record)
+        self._wait_durable(ticket)
+        return record["hash"]
+
+    def read_entry(self, filename):
+        """The entry's current text; raises FileNotFoundError if there's none."""
+        with self._lock:
+            self._catch_up()
+            text = self._current(filename)
+        if text is None:
+            raise FileNotFoundError(filename)
+        return text
+
+    def read_entry_with_revision(self, filename):
+        text = self.read_entry(filename)
+        return text, revision_of(text)
+
+    def revision(self, filename):
+        """The entry's revision, without reading an unchanged .md file again."""
+        with self._lock:
+            self._catch_up()
+            overlay = self._overlays.get(filename)
+            if overlay:
+                return overlay[1]
+
+            stat = os.stat(os.path.join(self.journal_dir, filename))
+            cached = self._snapshot_revisions.get(filename)
+            if cached and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                return cached[2]
+            text = self._snapshot(filename)
+            if text is None:
+                raise FileNotFoundError(filename)
+            revision = revision_of(text)
+            self._snapshot_revisions[filename] = (
+                stat.st_mtime_ns,
+                stat.st_size,
+                revision,
+            )
+            return revision
+
+    def exists(self, filename):
+        """Whether the entry exists, from its overlay or a stat of its file."""
+        with self._lock:
+            self._catch_up()
+            if filename in self._overlays:
+                return True
+        return os.path.isfile(os.path.join(self.journal_dir, filename))
+
+    def pending(self):
+        """{filename: revision} of entries with edits not yet in their .md file."""
+        with self._lock:
+            self._catch_up()
+            return {
+                filename: revision
+                for filename, (_, revision, _) in self._overlays.items()
+            }
+
+    def create_entry(self, filename, content):
+        with self._lock:
+            with file_lock(self.lock_file):
+                self._read_state()
+                self._catch_up()
+                if self._current(filename) is not None:
+                    raise FileExistsError(filename)
+                ticket = self._append(self._content_record(filename, content, None))
+        self._wait_durable(ticket)
+        return revision_of(content)
+
+    def _content_record(self, filename, content, base):
+        return {
+            "file": filename,
+            "ts": datetime.datetime.now().isoformat(),
+            "base": base,
+            "hash": revision_of(content),
+            "content": content,
+        }
+
+    def _delta_record(self, filename, current, revision, start, end, text):
+        return {
+            "file": filename,
+            "ts": datetime.datetime.now().isoformat(),
+            "base": revision,
+            "hash": revision_of(current[:start] + text + current[end:]),
+            "start": start,
+            "end": end,
+            "text": text,
+        }
+
+    def write_entry(self, filename, content, base_revision=None):
+        """Replace the entry's text. Returns the new revision.
+
+        Only the span that differs from the current text is logged. With
+        base_revision, raises RevisionConflict if the entry has changed since
+        that revision.
+        """
+
+        def make_record(current, revision):
+            if content == current:
+                return None
+            prefix = len(os.path.commonprefix([current, content]))
+            suffix = len(
+                os.path.commonprefix([current[prefix:][::-1], content[prefix:][::-1]])
+            )
+            text = content[prefix : len(content) - suffix]
+            if len(text) >= len(content) // 2:
+                return self._content_record(filename, content, revision)
+            return self._delta_record(
+                filename, current, revision, prefix, len(current) - suffix, text
+            )
+
+        return self._write(filename, make_record, base_revision)
+
+    def apply_delta(self, filename, start, end, text, base_revision):
+        """Replace characters start to end of the entry at base_revision.
+
+        Returns (new text, new revision).
+        """
+        result = {}
+
+        def make_record(current, revision):
+            if not 0 <= start <= end <= len(current):
+                raise ValueError("Delta is out of range")
+            result["text"] = current[:start] + text + current[end:]
+            return self._delta_record(filename, current, revision, start, end, text)
+
+        revision = self._write(filename, make_record, base_revision)
+        return result["text"], revision
+
+    def compact(self):
+        """Fold logged edits into the .md files and archive the sealed segment."""
+        with self._lock:
+            with file_lock(self.lock_file):
+                self._read_state()
+                self._catch_up()
+                if not self._overlays:
+                    return 0
+
+                # Seal the active segment: appends from now on go to the next
+                sealed = self._active
+                self._active += 1
+                self._write_state()
+
+                for filename, (text, _, _) in self._overlays.items():
+                    atomic_write_text(os.path.join(self.journal_dir, filename), text)
+                dir_fd = os.open(self.journal_dir, os.O_RDONLY)
+                try:
+                    os.fsync(dir_fd)
+                finally:
+                    os.close(dir_fd)
+
+                compacted = len(self._overlays)
+                self._compacted = sealed
+                self._write_state()
+                self._overlays = {}
+
+                for segment in [s for s in self._positions if s <= sealed]:
+                    path = self._segment_path(segment)
+                    if os.path.exists(path):
+                        os.replace(
+                            path, os.path.join(self.history_dir, os.path.basename(path))
+                        )
+                    del self._positions[segment]
+                return compacted
+
+    def history(self, filename):
+        """Every logged edit of an entry, oldest first, archived ones included."""
+        paths = [
+            os.path.join(directory, name)
+            for directory in (self.history_dir, self.log_dir)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".log")
+        ]
+        records = []
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    lines = f.read().splitlines()
+            except FileNotFoundError:
+                continue
+            for line in lines:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("file") == filename:
+                    records.append(record)
+        return records
+
+    def _run_compactor(self):
+        while True:
+            time.sleep(COMPACT_SECONDS)
+            try:
+                compacted = self.compact()
+                if compacted:
+                    print(f"Journal log compacted into {compacted} entries")
+            except Exception as e:
+                print(f"Error compacting journal log: {e}")
+
+    def start_compactor(self):
+        """Compact in the background; safe to call from every process."""
+        with self._lock:
+            if self._compactor is None:
+                self._compactor = threading.Thread(
+                    target=self._run_compactor, name="journal-compactor", daemon=True
+                )
+                self._compactor.start()
+
+
+# One log per process over the journal directory
+_journal_log = None
+_journal_log_lock = threading.Lock()
+
+
+def get_journal_log():
+    global _journal_log
+
+    with _journal_log_lock:
+        if _journal_log is None:
+            _journal_log = JournalLog()
+        return _journal_log
@@ -0,0 +1,185 @@
+import bisect
+import datetime
+import json
+import os
+import threading
+import time
+
+from file_utils import atomic_write_json, file_lock
+from journal_log import get_journal_log
+
+JOURNAL_DIR = "data"
+METADATA_FILE = os.path.join(JOURNAL_DIR, "journal_metadata.json")
+METADATA_LOCK_FILE = os.path.join(JOURNAL_DIR, "journal_metadata.lock")
+
+PREVIEW_LENGTH = 100
+
+# Listings re-check the files and the journal log at most this often; writes
+# made by this process are applied right away through update_entry
+VALIDATE_SECONDS = float(os.getenv("JOURNAL_METADATA_TTL", "2"))
+
+# filename -> metadata, plus the filenames in ascending order for paging
+_entries = None
+_filenames = []
+_validated_at = None
+_lock = threading.Lock()
+
+
+def _read_metadata(filename, stat, revision=None):
+    """Title and preview come from the first two lines.
+
+    An entry with edits still in the journal log (revision is then its
+    revision there) is read through the log; otherwise only the first two
+    lines of its .md file are read.
+    """
+    if revision is None:
+        with open(os.path.join(JOURNAL_DIR, filename), "r") as f:
+            lines = [f.readline(), f.readline()]
+    else:
+        lines = (get_journal_log().read_entry(filename).split("\n", 2) + ["", ""])[:2]
+    title = lines[0].rstrip("\n").strip("# ")  # Remove Markdown heading syntax
+    body = lines[1].rstrip("\n")
+
+    return {
+        "date": "-".join(filename.split("-")[:3]),  # Keep as YYYY-MM-DD
+        "title": title,
+        "preview": (
+            body[:PREVIEW_LENGTH] + "..." if len(body) > PREVIEW_LENGTH else body
+        ),
+        "filename": filename,
+        "mtime": stat.st_mtime_ns if stat else None,
+        "size": stat.st_size if stat else None,
+        "revision": revision,
+    }
+
+
+def _load():
+    try:
+        with open(METADATA_FILE, "r") as f:
+            return json.load(f)["entries"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+        return {}
+
+
+def _save():
+    # Every gunicorn worker keeps its own copy, so writes are serialized
+    with file_lock(METADATA_LOCK_FILE):
+        atomic_write_json(METADATA_FILE, {"entries": _entries})
+
+
+def _is_current(entry, stat, revision):
+    if revision is not None:
+        return entry.get("revision") == revision
+    return (
+        entry.get("revision") is None
+        and entry["mtime"] == stat.st_mtime_ns
+        and entry["size"] == stat.st_size
+    )
+
+
+def _validate():
+    """Re-read entries whose mtime, size or logged revision changed, drop
+    deleted ones.
+
+    Costs one stat per entry; only new or changed entries are read.
+    """
+    global _entries, _filenames, _validated_at
+
+    if _entries is None:
+        _entries = _load()
+        _filenames = sorted(_entries)
+
+    stats = {}
+    with os.scandir(JOURNAL_DIR) as it:
+        for dir_entry in it:
+            if dir_entry.name.endswith(".md") and dir_entry.is_file():
+                stats[dir_entry.name] = dir_entry.stat()
+
+    # Entries with edits not yet compacted into their .md files
+    pending = get_journal_log().pending()
+
+    changed = False
+    for filename in set(stats) | set(pending):
+        entry = _entries.get(filename)
+        stat = stats.get(filename)
+        revision = pending.get(filename)
+        if entry and _is_current(entry, stat, revision):
+            continue
+        try:
+            _entries[filename] = _read_metadata(filename, stat, revision)
+            changed = True
+        except FileNotFoundError:
+            stats.pop(filename, None)
+            pending.pop(filename, None)
+
+    for filename in [f for f in _entries if f not in stats and f not in pending]:
+        del _entries[filename]
+        changed = True
+
+    if changed:
+        _filenames = sorted(_entries)
+        _save()
+    _validated_at = time.monotonic()
+
+
+def update_entry(filename):
+    """Refresh one entry's metadata after this process wrote it.
+
+    Keeps new and edited entries visible between validations without a scan.
+    Only memory is updated; the saved index is checked against the files
+    when it is loaded anyway.
+    """
+    revision = get_journal_log().pending().get(filename)
+    with _lock:
+        if _entries is None:
+            return  # Loaded and validated by the first listing
+        try:
+            stat = os.stat(os.path.join(JOURNAL_DIR, filename))
+        except FileNotFoundError:
+            stat = None
+        try:
+            if stat is None and revision is None:
+                raise FileNotFoundError(filename)
+            metadata = _read_metadata(filename, stat, revision)
+        except FileNotFoundError:
+            if _entries.pop(filename, None):
+                _filenames.remove(filename)
+            return
+        if filename not in _entries:
+            bisect.insort(_filenames, filename)
+        _entries[filename] = metadata
+
+
+def _public(entry):
+    return {key: entry[key] for key in ("date", "title", "preview", "filename")}
+
+
+def list_entries(limit=None, before=None, start_date=None, end_date=None):
+    """Return a page of entries, latest first, and the cursor for the next one.
+
+    before is the cursor: only entries whose filename sorts before it are
+    returned. start_date and end_date keep entries whose YYYY-MM-DD filename
+    prefix falls in that range, inclusive. The next cursor is None on the last
+    page.
+    """
+    with _lock:
+        if (
+            _validated_at is None
+            or time.monotonic() - _validated_at >= VALIDATE_SECONDS
+        ):
+            _validate()
+
+        # Filenames start with their date, so date bounds are filename bounds
+        lo, hi = 0, len(_filenames)
+        if start_date is not None:
+            lo = bisect.bisect_left(_filenames, start_date.isoformat())
+        if end_date is not None:
+            next_day = end_date + datetime.timedelta(days=1)
+            hi = bisect.bisect_left(_filenames, next_day.isoformat())
+        if before is not None:
+            hi = min(hi, bisect.bisect_left(_filenames, before))
+        start = lo if limit is None else max(hi - limit, lo)
+
+        page = [_public(_entries[f]) for f in reversed(_filenames[start:hi])]
+        next_cursor = page[-1]["filename"] if page and start > lo else None
+        return page, next_cursor
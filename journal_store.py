@@ -0,0 +1,455 @@
+import argparse
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+import journal_metadata
+from file_utils import atomic_write_text
+from journal_log import JournalLog, RevisionConflict, get_journal_log, revision_of
+
+JOURNAL_DIR = "data"
+
+# "files" keeps entries as .md files written through the journal log;
+# "sqlite" keeps them in a database with an FTS5 index, so listing, date
+# ranges and keyword search are indexed lookups. Move existing entries with
+# `python journal_store.py import [DIR]` and back with `export [DIR]`.
+JOURNAL_BACKEND = os.getenv("JOURNAL_BACKEND", "files")
+JOURNAL_DB = os.getenv("JOURNAL_DB", os.path.join(JOURNAL_DIR, "journal.db"))
+
+SEARCH_LIMIT = 20
+SNIPPET_CHARS = 80
+
+TOKEN_RE = re.compile(r"\w+")
+
+
+def _date_bounds(start_date, end_date):
+    """Filenames start with their date, so date bounds are filename bounds."""
+    lo = start_date.isoformat() if start_date else None
+    hi = (end_date + datetime.timedelta(days=1)).isoformat() if end_date else None
+    return lo, hi
+
+
+def _one_line(text):
+    return " ".join(text.split())
+
+
+def _summary(filename, content):
+    lines = (content.split("\n", 2) + ["", ""])[:2]
+    body = lines[1]
+    return {
+        "date": "-".join(filename.split("-")[:3]),  # Keep as YYYY-MM-DD
+        "title": lines[0].strip("# "),  # Remove Markdown heading syntax
+        "preview": (
+            body[: journal_metadata.PREVIEW_LENGTH] + "..."
+            if len(body) > journal_metadata.PREVIEW_LENGTH
+            else body
+        ),
+        "filename": filename,
+    }
+
+
+class FlatFileStore:
+    """Entries as .md files, written through the journal log.
+
+    Listing is served by the metadata index; search reads every entry.
+    """
+
+    def __init__(self):
+        self.journal_log = get_journal_log()
+        self.watch_paths = [JOURNAL_DIR, self.journal_log.log_dir]
+
+    def start_compactor(self):
+        self.journal_log.start_compactor()
+
+    def is_change(self, change, path):
+        """Whether a file event from watch_paths may be an entry change."""
+        directory = os.path.dirname(os.path.abspath(path))
+        if path.endswith(".md"):
+            return directory == os.path.abspath(JOURNAL_DIR)
+        return path.endswith(".log") and directory == os.path.abspath(
+            self.journal_log.log_dir
+        )
+
+    def read_entry(self, filename):
+        return self.journal_log.read_entry(filename)
+
+    def read_entry_with_revision(self, filename):
+        return self.journal_log.read_entry_with_revision(filename)
+
+    def revision(self, filename):
+        return self.journal_log.revision(filename)
+
+    def exists(self, filename):
+        return self.journal_log.exists(filename)
+
+    def create_entry(self, filename, content):
+        revision = self.journal_log.create_entry(filename, content)
+        journal_metadata.update_entry(filename)
+        return revision
+
+    def write_entry(self, filename, content, base_revision=None):
+        revision = self.journal_log.write_entry(filename, content, base_revision)
+        journal_metadata.update_entry(filename)
+        return revision
+
+    def apply_delta(self, filename, start, end, text, base_revision):
+        revision = self.journal_log.apply_delta(
+            filename, start, end, text, base_revision
+        )
+        journal_metadata.update_entry(filename)
+        return revision
+
+    def versions(self):
+        """{filename: version} for every entry; a version changes with its text.
+
+        Costs one stat per entry.
+        """
+        versions = {}
+        with os.scandir(JOURNAL_DIR) as it:
+            for dir_entry in it:
+                if dir_entry.name.endswith(".md") and dir_entry.is_file():
+                    stat = dir_entry.stat()
+                    versions[dir_entry.name] = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+        versions.update(self.journal_log.pending())
+        return versions
+
+    def list_entries(self, limit=None, before=None, start_date=None, end_date=None):
+        return journal_metadata.list_entries(limit, before, start_date, end_date)
+
+    def _filenames(self):
+        """Every entry's filename, without a stat per entry."""
+        with os.scandir(JOURNAL_DIR) as it:
+            filenames = {
+                dir_entry.name for dir_entry in it if dir_entry.name.endswith(".md")
+            }
+        return filenames | set(self.journal_log.pending())
+
+    def search(self, query, limit=SEARCH_LIMIT, start_date=None, end_date=None):
+        """Entries containing every word of the query, most matches first."""
+        terms = set(TOKEN_RE.findall(query.casefold()))
+        if not terms:
+            return []
+        lo, hi = _date_bounds(start_date, end_date)
+
+        results = []
+        for filename in self._filenames():
+            if lo and filename < lo or hi and filename >= hi:
+                continue
+            try:
+                content = self.read_entry(filename)
+            except FileNotFoundError:
+                continue
+            folded = content.casefold()
+            if not all(term in folded for term in terms):
+                continue
+            counts = {term: len(re.findall(rf"\b{term}\b", folded)) for term in terms}
+            if not all(counts.values()):
+                continue
+
+            first = min(folded.find(term) for term in terms)
+            start = max(first - SNIPPET_CHARS // 2, 0)
+            end = start + SNIPPET_CHARS
+            snippet = (
+                ("..." if start else "")
+                + content[start:end]
+                + ("..." if end < len(content) else "")
+            )
+            results.append((sum(counts.values()), filename, content, snippet))
+
+        results.sort(key=lambda result: (-result[0], result[1]))
+        return [
+            {**_summary(filename, content), "snippet": _one_line(snippet)}
+            for _, filename, content, snippet in results[:limit]
+        ]
+
+
+class SQLiteStore:
+    """Entries, with their titles and dates, in SQLite and an FTS5 index.
+
+    Every thread gets its own connection. Writes run in an immediate
+    transaction, so the revision check and the write are atomic across
+    processes.
+    """
+
+    def __init__(self, db_path=JOURNAL_DB):
+        self.db_path = db_path
+        self.watch_paths = [os.path.dirname(os.path.abspath(db_path))]
+        self._local = threading.local()
+
+        with self._connect() as connection:
+            connection.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    filename TEXT PRIMARY KEY,
+                    date TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    preview TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    revision TEXT NOT NULL
+                );
+                CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+                    title, content, content='entries', content_rowid='rowid'
+                );
+                CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN
+                    INSERT INTO entries_fts(rowid, title, content)
+                    VALUES (new.rowid, new.title, new.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_ad AFTER DELETE ON entries BEGIN
+                    INSERT INTO entries_fts(entries_fts, rowid, title, content)
+                    VALUES ('delete', old.rowid, old.title, old.content);
+                END;
+                CREATE TRIGGER IF NOT EXISTS entries_au AFTER UPDATE ON entries BEGIN
+                    INSERT INTO entries_fts(entries_fts, rowid, title, content)
+                    VALUES ('delete', old.rowid, old.title, old.content);
+                    INSERT INTO entries_fts(rowid, title, content)
+                    VALUES (new.rowid, new.title, new.content);
+                END;
+                """)
+
+    def _connect(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # Readers don't block the writer, or each other
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def start_compactor(self):
+        pass  # Writes go straight to the database, there is no log to fold
+
+    def is_change(self, change, path):
+        return os.path.basename(path).startswith(os.path.basename(self.db_path))
+
+    def _row(self, filename, columns):
+        row = (
+            self._connect()
+            .execute(f"SELECT {columns} FROM entries WHERE filename = ?", (filename,))
+            .fetchone()
+        )
+        if row is None:
+            raise FileNotFoundError(filename)
+        return row
+
+    def read_entry(self, filename):
+        return self._row(filename, "content")["content"]
+
+    def read_entry_with_revision(self, filename):
+        row = self._row(filename, "content, revision")
+        return row["content"], row["revision"]
+
+    def revision(self, filename):
+        return self._row(filename, "revision")["revision"]
+
+    def exists(self, filename):
+        try:
+            self.revision(filename)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put_entry(self, filename, content):
+        """Insert or replace an entry without any checks, for imports."""
+        summary = _summary(filename, content)
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO entries (filename, date, title, preview, content, revision)"
+                " VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (filename) DO UPDATE SET date = excluded.date,"
+                " title = excluded.title, preview = excluded.preview,"
+                " content = excluded.content, revision = excluded.revision",
+                (
+                    filename,
+                    summary["date"],
+                    summary["title"],
+                    summary["preview"],
+                    content,
+                    revision_of(content),
+                ),
+            )
+
+    def create_entry(self, filename, content):
+        try:
+            self._insert(filename, content)
+        except sqlite3.IntegrityError:
+            raise FileExistsError(filename)
+        return revision_of(content)
+
+    def _insert(self, filename, content):
+        summary = _summary(filename, content)
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT INTO entries (filename, date, title, preview, content, revision)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    filename,
+                    summary["date"],
+                    summary["title"],
+                    summary["preview"],
+                    content,
+                    revision_of(content),
+                ),
+            )
+
+    def _update(self, filename, make_content, base_revision):
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT content, revision FROM entries WHERE filename = ?",
+                (filename,),
+            ).fetchone()
+            if row is None:
+                raise FileNotFoundError(filename)
+            if base_revision is not None and base_revision != row["revision"]:
+                raise RevisionConflict(row["revision"])
+
+            content = make_content(row["content"])
+            if content == row["content"]:
+                return content, row["revision"]
+            summary = _summary(filename, content)
+            revision = revision_of(content)
+            connection.execute(
+                "UPDATE entries SET title = ?, preview = ?, content = ?, revision = ?"
+                " WHERE filename = ?",
+                (summary["title"], summary["preview"], content, revision, filename),
+            )
+        return content, revision
+
+    def write_entry(self, filename, content, base_revision=None):
+        return self._update(filename, lambda current: content, base_revision)[1]
+
+    def apply_delta(self, filename, start, end, text, base_revision):
+        def make_content(current):
+            if not 0 <= start <= end <= len(current):
+                raise ValueError("Delta is out of range")
+            return current[:start] + text + current[end:]
+
+        return self._update(filename, make_content, base_revision)
+
+    def versions(self):
+        rows = self._connect().execute("SELECT filename, revision FROM entries")
+        return {row["filename"]: row["revision"] for row in rows}
+
+    def list_entries(self, limit=None, before=None, start_date=None, end_date=None):
+        """Same pages and cursors as the metadata index, from the primary key."""
+        lo, hi = _date_bounds(start_date, end_date)
+        if before is not None and (hi is None or before < hi):
+            hi = before
+
+        query = "SELECT filename, date, title, preview FROM entries WHERE 1"
+        params = []
+        if lo is not None:
+            query += " AND filename >= ?"
+            params.append(lo)
+        if hi is not None:
+            query += " AND filename < ?"
+            params.append(hi)
+        query += " ORDER BY filename DESC"
+        if limit is not None:
+            # One extra row tells whether there is a next page
+            query += " LIMIT ?"
+            params.append(limit + 1)
+
+        rows = self._connect().execute(query, params).fetchall()
+        page = [dict(row) for row in rows[:limit]]
+        next_cursor = page[-1]["filename"] if limit and len(rows) > limit else None
+        return page, next_cursor
+
+    def search(self, query, limit=SEARCH_LIMIT, start_date=None, end_date=None):
+        """Entries containing every word of the query, best BM25 match first."""
+        terms = TOKEN_RE.findall(query)
+        if not terms:
+            return []
+        lo, hi = _date_bounds(start_date, end_date)
+
+        sql = (
+            "SELECT e.filename, e.date, e.title, e.preview,"
+            " snippet(entries_fts, 1, '', '', '...', 16) AS snippet"
+            " FROM entries_fts JOIN entries e ON e.rowid = entries_fts.rowid"
+            " WHERE entries_fts MATCH ?"
+        )
+        # Quoted, so user input is never read as FTS5 query syntax
+        params = [" ".join(f'"{term}"' for term in terms)]
+        if lo is not None:
+            sql += " AND e.filename >= ?"
+            params.append(lo)
+        if hi is not None:
+            sql += " AND e.filename < ?"
+            params.append(hi)
+        sql += " ORDER BY bm25(entries_fts) LIMIT ?"
+        params.append(limit)
+        return [
+            {**dict(row), "snippet": _one_line(row["snippet"])}
+            for row in self._connect().execute(sql, params)
+        ]
+
+
+def read_markdown_entries(directory):
+    """(filename, content) of the entries in a directory of .md files,
+    including edits still in its journal log."""
+    journal_log = (
+        get_journal_log()
+        if os.path.abspath(directory) == os.path.abspath(JOURNAL_DIR)
+        else JournalLog(directory)
+    )
+    filenames = {f for f in os.listdir(directory) if f.endswith(".md")}
+    for filename in sorted(filenames | set(journal_log.pending())):
+        yield filename, journal_log.read_entry(filename)
+
+
+def import_entries(directory, store):
+    count = 0
+    for filename, content in read_markdown_entries(directory):
+        store.put_entry(filename, content)
+        count += 1
+    return count
+
+
+def export_entries(store, directory):
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for filename in sorted(store.versions()):
+        atomic_write_text(os.path.join(directory, filename), store.read_entry(filename))
+        count += 1
+    return count
+
+
+# One store per process
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_journal_store():
+    global _store
+
+    with _store_lock:
+        if _store is None:
+            if JOURNAL_BACKEND == "sqlite":
+                _store = SQLiteStore()
+            elif JOURNAL_BACKEND == "files":
+                _store = FlatFileStore()
+            else:
+                raise ValueError(f"Unknown JOURNAL_BACKEND: {JOURNAL_BACKEND}")
+        return _store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Copy journal entries between .md files and the SQLite store"
+    )
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("directory", nargs="?", default=JOURNAL_DIR)
+    parser.add_argument("--db", default=JOURNAL_DB, help="SQLite database")
+    args = parser.parse_args()
+
+    store = SQLiteStore(args.db)
+    if args.command == "import":
+        count = import_entries(args.directory, store)
+        print(f"Imported {count} entries from {args.directory} into {args.db}")
+    else:
+        count = export_entries(store, args.directory)
+        print(f"Exported {count} entries from {args.db} to {args.directory}")
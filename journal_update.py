@@ -0,0 +1,152 @@
+import asyncio
+import os
+import time
+
+from journal_edits import (
+    EditError,
+    apply_edits,
+    parse_edits,
+    render_sections,
+    split_sections,
+)
+from journal_log import RevisionConflict
+from journal_store import get_journal_store
+from prompts import JOURNAL_EDIT_PROMPT, JOURNAL_PROMPT
+
+# Minimum seconds between partial writes of a streaming journal update
+STREAM_INTERVAL = float(os.getenv("JOURNAL_STREAM_INTERVAL", "0.5"))
+
+# Entries at least this long are updated with edits instead of a full rewrite
+EDIT_MIN_CHARS = int(os.getenv("JOURNAL_EDIT_MIN_CHARS", "1500"))
+
+
+def _user_content(user_input, conversation_context):
+    user_content = f"User input for journal update: {user_input}"
+    if conversation_context:
+        user_content = f"Recent conversation:\n{conversation_context}\n\n{user_content}"
+    return user_content
+
+
+def build_journal_prompt(existing_entry, user_input, conversation_context=""):
+    """Build the one prompt that turns an entry and the user's input into the
+    complete updated entry."""
+    return JOURNAL_PROMPT.format(
+        existing_entry=existing_entry.strip(),
+        user_content=_user_content(user_input, conversation_context),
+    )
+
+
+def build_edit_prompt(existing_entry, user_input, conversation_context=""):
+    """Build the prompt asking for section-addressed edits to the entry."""
+    return JOURNAL_EDIT_PROMPT.format(
+        sections=render_sections(split_sections(existing_entry)),
+        user_content=_user_content(user_input, conversation_context),
+    )
+
+
+async def _read_at(store, filename, base_revision):
+    """The entry and its revision; raises RevisionConflict if base_revision is
+    given and the entry has moved past it."""
+    # Store calls may wait on file locks and fsyncs, so they run in threads
+    text, revision = await asyncio.to_thread(store.read_entry_with_revision, filename)
+    if base_revision is not None and revision != base_revision:
+        raise RevisionConflict(revision)
+    return text, revision
+
+
+async def stream_journal_update(
+    client,
+    model,
+    filename,
+    prompt,
+    on_progress=None,
+    interval=STREAM_INTERVAL,
+    store=None,
+    base_revision=None,
+):
+    """Generate the updated entry in a single streamed completion.
+
+    The text is written to the journal store as it arrives, at most once per
+    interval, and passed to on_progress(text, done) so the editor can follow
+    along. If the completion fails or comes back empty, the original entry is
+    restored. Returns the updated entry.
+
+    base_revision is the revision the prompt was built from. Each write is
+    based on the revision the previous one produced, so if the entry is edited
+    elsewhere in the meantime, RevisionConflict is raised and the update stops
+    without overwriting that edit.
+    """
+    store = store or get_journal_store()
+    original, revision = await _read_at(store, filename, base_revision)
+
+    updated_entry = ""
+    try:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=1000,
+            stream=True,
+        )
+
+        # The first tokens are shown right away, later ones are throttled
+        last_flush = 0.0
+        async for chunk in stream:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            updated_entry += chunk.choices[0].delta.content
+
+            if time.monotonic() - last_flush >= interval:
+                last_flush = time.monotonic()
+                revision = await asyncio.to_thread(
+                    store.write_entry, filename, updated_entry.strip(), revision
+                )
+                if on_progress:
+                    await on_progress(updated_entry.strip(), False)
+
+        updated_entry = updated_entry.strip()
+        if not updated_entry:
+            raise ValueError("The model returned an empty journal entry")
+        await asyncio.to_thread(store.write_entry, filename, updated_entry, revision)
+    except RevisionConflict:
+        raise
+    except BaseException:
+        try:
+            await asyncio.to_thread(store.write_entry, filename, original, revision)
+        except RevisionConflict:
+            pass  # Edited elsewhere since the last partial write; keep that
+        raise
+
+    if on_progress:
+        await on_progress(updated_entry, True)
+    return updated_entry
+
+
+async def edit_journal_entry(
+    client, model, filename, prompt, store=None, base_revision=None
+):
+    """Update the entry from edits returned by a single completion.
+
+    The model only writes the sections that change, so output tokens scale
+    with the size of the change rather than the entry. Raises EditError if the
+    edits can't be applied, and RevisionConflict if the entry moved past
+    base_revision or was edited elsewhere meanwhile; the entry is left
+    untouched in both cases. Returns the updated entry.
+    """
+    store = store or get_journal_store()
+    existing_entry, revision = await _read_at(store, filename, base_revision)
+
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0.3,
+        max_tokens=1000,
+    )
+    updated_entry = apply_edits(
+        existing_entry, parse_edits(response.choices[0].message.content or "")
+    )
+    if not updated_entry:
+        raise EditError("The edits left the journal entry empty")
+
+    await asyncio.to_thread(store.write_entry, filename, updated_entry, revision)
+    return updated_entry
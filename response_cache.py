@@ -0,0 +1,146 @@
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from langfuse.decorators import langfuse_context
+
+# How long each tool's results stay fresh, in seconds. Journal and calendar
+# results are also dropped as soon as the underlying index changes.
+TOOL_TTLS = {
+    "get_top_news": int(os.getenv("NEWS_CACHE_TTL", "600")),
+    "journal_search": int(os.getenv("JOURNAL_SEARCH_CACHE_TTL", "86400")),
+    "calendar_search": int(os.getenv("CALENDAR_SEARCH_CACHE_TTL", "3600")),
+}
+
+# Cosine similarity at which a differently worded query counts as a hit; 0 disables
+SIMILARITY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_SIMILARITY", "0"))
+
+MAX_ENTRIES = 256
+
+
+def normalize_query(query):
+    """Make trivially different phrasings of a query share a cache key."""
+    return re.sub(r"\s+", " ", query.casefold()).strip().rstrip("?!. ")
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class ResponseCache:
+    """In-memory cache of tool results, kept per tool.
+
+    Every tool has a generation counter that invalidate() bumps. A result is
+    only stored if the generation is unchanged since its lookup, so a result
+    computed from an index that changed meanwhile is never cached.
+    """
+
+    def __init__(self, ttls, similarity_threshold=0.0, max_entries=MAX_ENTRIES):
+        self.ttls = ttls
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # tool -> OrderedDict(key -> (value, expires_at, embedding)), oldest first
+        self._entries = {}
+        self._generations = {}
+        self._stats = {}
+
+    def generation(self, tool):
+        with self._lock:
+            return self._generations.get(tool, 0)
+
+    def lookup(self, tool, key, embedding=None):
+        """Return (hit, value) for an exact or, with an embedding, similar key."""
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries.setdefault(tool, OrderedDict())
+            stats = self._stats.setdefault(tool, {"hits": 0, "misses": 0})
+
+            for stale_key in [k for k, e in entries.items() if e[1] <= now]:
+                del entries[stale_key]
+
+            match = key if key in entries else None
+            if match is None and embedding is not None and self.similarity_threshold:
+                best = 0.0
+                for other_key, (_, _, other_embedding) in entries.items():
+                    if other_embedding is None:
+                        continue
+                    similarity = _cosine(embedding, other_embedding)
+                    if similarity >= max(best, self.similarity_threshold):
+                        best, match = similarity, other_key
+
+            if match is None:
+                stats["misses"] += 1
+                return False, None
+            stats["hits"] += 1
+            entries.move_to_end(match)
+            return True, entries[match][0]
+
+    def store(self, tool, key, value, generation, embedding=None):
+        with self._lock:
+            if self._generations.get(tool, 0) != generation:
+                return
+            entries = self._entries.setdefault(tool, OrderedDict())
+            entries[key] = (value, time.monotonic() + self.ttls[tool], embedding)
+            entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+
+    def invalidate(self, tool):
+        with self._lock:
+            self._generations[tool] = self._generations.get(tool, 0) + 1
+            self._entries.pop(tool, None)
+
+    def stats(self):
+        """Hits, misses and hit rate per tool."""
+        with self._lock:
+            return {
+                tool: {
+                    **stats,
+                    "hit_rate": stats["hits"] / (stats["hits"] + stats["misses"]),
+                }
+                for tool, stats in self._stats.items()
+                if stats["hits"] + stats["misses"]
+            }
+
+
+response_cache = ResponseCache(TOOL_TTLS, SIMILARITY_THRESHOLD)
+
+
+def invalidate(tool):
+    response_cache.invalidate(tool)
+
+
+async def cached(tool, query, compute, embed=None):
+    """Return compute()'s result for query, from the cache when possible.
+
+    With similarity lookups enabled, embed(query) is awaited to find cached
+    results for differently worded queries. Exceptions from compute() are
+    never cached. The outcome is logged and attached to the current Langfuse
+    observation.
+    """
+    key = normalize_query(query)
+    embedding = None
+    if embed is not None and response_cache.similarity_threshold:
+        embedding = await embed(key)
+
+    generation = response_cache.generation(tool)
+    hit, value = response_cache.lookup(tool, key, embedding)
+    if not hit:
+        value = await compute()
+        response_cache.store(tool, key, value, generation, embedding)
+
+    stats = response_cache.stats()[tool]
+    print(
+        f"Response cache {'hit' if hit else 'miss'} for {tool} "
+        f"(hit rate {stats['hit_rate']:.0%} of {stats['hits'] + stats['misses']})"
+    )
+    langfuse_context.update_current_observation(
+        metadata={"response_cache": "hit" if hit else "miss", "cache_stats": stats}
+    )
+    return value
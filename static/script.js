@@ -1,29 +1,101 @@
+// Entries are fetched a page at a time; older pages load as the sidebar scrolls
+const ENTRY_PAGE_SIZE = 50;
+let entryListGeneration = 0;
+let entryListObserver = null;
+
+async function fetchEntryPage(limit, before) {
+  const params = new URLSearchParams({ limit });
+  if (before) {
+    params.set("before", before);
+  }
+  const response = await fetch(`/api/journal-entries?${params}`);
+  const entries = await response.json();
+  return { entries, nextCursor: response.headers.get("X-Next-Cursor") };
+}
+
+function appendEntries(entries) {
+  const entryList = document.getElementById("entry-list");
+  entries.forEach((entry) => {
+    const li = document.createElement("li");
+    li.className = "entry-item";
+    li.dataset.filename = entry.filename;
+    li.innerHTML = `
+      <div class="entry-title" title="${entry.title}">${entry.title}</div>
+      <div class="entry-preview">
+        <span class="entry-date">${entry.date}</span>
+        ${entry.preview}
+      </div>
+    `;
+    li.addEventListener("click", () => loadEntry(entry.filename));
+    entryList.appendChild(li);
+  });
+}
+
+// Load the next page once the end of the list scrolls into view
+function observeNextPage(cursor, generation) {
+  if (!cursor) {
+    return;
+  }
+  const entryList = document.getElementById("entry-list");
+  const sentinel = document.createElement("li");
+  sentinel.className = "entry-list-sentinel";
+  entryList.appendChild(sentinel);
+
+  entryListObserver = new IntersectionObserver(
+    async (observed) => {
+      if (!observed.some((item) => item.isIntersecting)) {
+        return;
+      }
+      entryListObserver.disconnect();
+      sentinel.remove();
+      try {
+        const { entries, nextCursor } = await fetchEntryPage(
+          ENTRY_PAGE_SIZE,
+          cursor
+        );
+        if (generation !== entryListGeneration) {
+          return;
+        }
+        appendEntries(entries);
+        highlightCurrentEntry(
+          document.getElementById("editor-content").dataset.currentFilename
+        );
+        observeNextPage(nextCursor, generation);
+      } catch (error) {
+        console.error("Error loading more journal entries:", error);
+      }
+    },
+    { root: entryList.parentElement, rootMargin: "200px" }
+  );
+  entryListObserver.observe(sentinel);
+}
+
 // Function to load and display journal entries
 async function loadJournalEntries() {
+  const generation = ++entryListGeneration;
+  if (entryListObserver) {
+    entryListObserver.disconnect();
+  }
+
   try {
-    const response = await fetch("/api/journal-entries");
-    const entries = await response.json();
     const entryList = document.getElementById("entry-list");
     const currentFilename =
       document.getElementById("editor-content").dataset.currentFilename;
 
+    // Reloads keep as many entries as are already shown, so the list
+    // doesn't collapse back to the first page after every save
+    const shown = entryList.querySelectorAll(".entry-item").length;
+    const { entries, nextCursor } = await fetchEntryPage(
+      Math.max(ENTRY_PAGE_SIZE, shown)
+    );
+    if (generation !== entryListGeneration) {
+      return;
+    }
+
     // Clear existing entries
     entryList.innerHTML = "";
-
-    entries.forEach((entry) => {
-      const li = document.createElement("li");
-      li.className = "entry-item";
-      li.dataset.filename = entry.filename;
-      li.innerHTML = `
-        <div class="entry-title" title="${entry.title}">${entry.title}</div>
-        <div class="entry-preview">
-          <span class="entry-date">${entry.date}</span>
-          ${entry.preview}
-        </div>
-      `;
-      li.addEventListener("click", () => loadEntry(entry.filename));
-      entryList.appendChild(li);
-    });
+    appendEntries(entries);
+    observeNextPage(nextCursor, generation);
 
     // Highlight the current entry
     highlightCurrentEntry(currentFilename);
@@ -88,6 +160,40 @@ async function loadEntry(filename) {
 let autoSaveTimeout;
 const AUTO_SAVE_DELAY = 2000; // 2 seconds
 
+// The entry as last saved: autosave sends only what changed since then,
+// based on its revision. markdown is null until the server's text is known.
+let savedEntry = { filename: null, revision: null, markdown: null };
+
+function setSavedEntry(filename, revision, markdown) {
+  savedEntry = { filename, revision, markdown };
+}
+
+// The smallest single replacement turning oldText into newText. Offsets are
+// in code points, matching how the server indexes the entry.
+function computeDelta(oldText, newText) {
+  const oldChars = Array.from(oldText);
+  const newChars = Array.from(newText);
+  let start = 0;
+  while (
+    start < oldChars.length &&
+    start < newChars.length &&
+    oldChars[start] === newChars[start]
+  ) {
+    start++;
+  }
+  let oldEnd = oldChars.length;
+  let newEnd = newChars.length;
+  while (
+    oldEnd > start &&
+    newEnd > start &&
+    oldChars[oldEnd - 1] === newChars[newEnd - 1]
+  ) {
+    oldEnd--;
+    newEnd--;
+  }
+  return { start, end: oldEnd, text: newChars.slice(start, newEnd).join("") };
+}
+
 // Modify the existing autoSaveEntry function
 async function autoSaveEntry() {
   const editorContent = document.getElementById("editor-content");
@@ -109,18 +215,52 @@ async function autoSaveEntry() {
     const markdownContent = htmlToMarkdown(htmlContent);
     console.log("Markdown content after conversion:", markdownContent);
 
+    // Send a delta against the last saved text when we have it, otherwise
+    // the full entry; either way the save is tied to the revision we saw
+    let payload = { content: markdownContent };
+    if (savedEntry.filename === currentFilename && savedEntry.revision) {
+      payload = { content: markdownContent, base_revision: savedEntry.revision };
+      if (savedEntry.markdown !== null) {
+        const delta = computeDelta(savedEntry.markdown, markdownContent);
+        if (delta.start === delta.end && delta.text === "") {
+          saveIndicator.classList.remove("visible");
+          return;
+        }
+        payload = { base_revision: savedEntry.revision, delta };
+      }
+    }
+
     const response = await fetch(`/api/update-entry/${currentFilename}`, {
       method: "POST",
       headers: {
         "Content-Type": "application/json",
       },
-      body: JSON.stringify({ content: markdownContent }),
+      body: JSON.stringify(payload),
     });
 
+    if (response.status === 409) {
+      // The entry changed elsewhere, e.g. through the chat: show that version
+      // instead of overwriting it
+      console.warn("Entry changed elsewhere, reloading instead of saving");
+      saveIndicator.textContent = "Entry changed elsewhere, reloaded";
+      setSavedEntry(currentFilename, null, null);
+      await reloadCurrentJournalEntry();
+      setTimeout(() => {
+        saveIndicator.classList.remove("visible");
+      }, 2000);
+      return;
+    }
     if (!response.ok) {
       throw new Error("Failed to auto-save entry");
     }
 
+    const result = await response.json();
+    setSavedEntry(
+      currentFilename,
+      result.revision,
+      result.content !== undefined ? result.content : markdownContent
+    );
+
     console.log("Entry auto-saved successfully");
     saveIndicator.textContent = "Saved";
 
@@ -282,6 +422,15 @@ async function handleEditorFocus() {
 window.addEventListener("chainlit-call-fn", (e) => {
   const { name, args, callback } = e.detail;
   if (name === "update_journal") {
+    const editorContent = document.getElementById("editor-content");
+    if (args.content !== undefined) {
+      // Partial update while the entry is still being written
+      if (editorContent.dataset.currentFilename === args.filename) {
+        editorContent.innerHTML = markdownToHtml(args.content);
+      }
+      callback("Journal entry streamed");
+      return;
+    }
     console.log("Updating journal entry:", args.filename);
     reloadCurrentJournalEntry();
     callback("Journal entry updated successfully");
@@ -299,6 +448,7 @@ async function createNewEntry() {
     const editorContent = document.getElementById("editor-content");
     editorContent.innerHTML = `<h1>${newEntry.title}</h1><p></p>`;
     editorContent.dataset.currentFilename = newEntry.filename;
+    setSavedEntry(newEntry.filename, newEntry.revision, newEntry.content);
 
     // Remove the 'placeholder' class if it exists
     editorContent.classList.remove("placeholder");
@@ -334,6 +484,16 @@ async function reloadCurrentJournalEntry() {
       const response = await fetch(`/api/journal-entry/${currentFilename}`);
       if (response.ok) {
         const content = await response.text();
+
+        // Keep the saved text if this is the revision we saved ourselves;
+        // otherwise the next save sends the full entry against this revision
+        const revision = response.headers.get("X-Entry-Revision");
+        if (
+          savedEntry.filename !== currentFilename ||
+          savedEntry.revision !== revision
+        ) {
+          setSavedEntry(currentFilename, revision, null);
+        }
         // Convert Markdown to HTML
         editorContent.innerHTML = markdownToHtml(content);
         console.log("Journal entry reloaded successfully");
@@ -458,14 +618,15 @@ function updateCalendarSidebar(events, date) {
 // Function to open today's latest note
 async function openTodaysLatestNote() {
   try {
-    const response = await fetch("/api/journal-entries");
-    const entries = await response.json();
-
     const today = new Date().toISOString().split("T")[0];
-    const todaysEntries = entries.filter((entry) => entry.date === today);
+    // Entries are sorted latest first, so the first of today's is the latest
+    const response = await fetch(
+      `/api/journal-entries?from=${today}&to=${today}&limit=1`
+    );
+    const todaysEntries = await response.json();
 
     if (todaysEntries.length > 0) {
-      const latestEntry = todaysEntries[0]; // Entries are already sorted latest first
+      const latestEntry = todaysEntries[0];
       await loadEntry(latestEntry.filename);
     } else {
       await createNewEntry();
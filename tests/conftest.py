@@ -0,0 +1,24 @@
+import os
+
+import pytest
+
+import journal_log
+import journal_metadata
+import journal_store
+
+
+@pytest.fixture
+def journal_dir(tmp_path, monkeypatch):
+    """An empty data/ in a fresh working directory, with no shared store state.
+
+    The journal modules work on data/ relative to the working directory and
+    keep per-process singletons, so each test starts from scratch.
+    """
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    monkeypatch.setattr(journal_log, "_journal_log", None)
+    monkeypatch.setattr(journal_store, "_store", None)
+    monkeypatch.setattr(journal_metadata, "_entries", None)
+    monkeypatch.setattr(journal_metadata, "_filenames", [])
+    monkeypatch.setattr(journal_metadata, "_validated_at", None)
+    return tmp_path / "data"
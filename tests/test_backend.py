@@ -0,0 +1,111 @@
+import pytest
+
+import backend
+from journal_store import get_journal_store
+
+FILENAME = "2024-01-01-entry.md"
+
+
+@pytest.fixture
+def client(journal_dir):
+    get_journal_store().create_entry(FILENAME, "# Monday\n\nWent for a run.")
+    return backend.app.test_client()
+
+
+def save(client, **data):
+    return client.post(f"/api/update-entry/{FILENAME}", json=data)
+
+
+def test_entry_is_served_with_its_revision(client):
+    revision = get_journal_store().revision(FILENAME)
+    response = client.get(f"/api/journal-entry/{FILENAME}")
+    assert response.status_code == 200
+    assert response.headers["X-Entry-Revision"] == revision
+    assert "Went for a run." in response.get_data(as_text=True)
+
+    cached = client.get(
+        f"/api/journal-entry/{FILENAME}", headers={"If-None-Match": f'"{revision}"'}
+    )
+    assert cached.status_code == 304
+
+
+def test_delta_applies_against_its_base_revision(client):
+    revision = get_journal_store().revision(FILENAME)
+    start = len("# Monday\n\nWent for a ")
+    response = save(
+        client,
+        base_revision=revision,
+        delta={"start": start, "end": start + 3, "text": "walk"},
+    )
+    assert response.status_code == 200
+    new_revision = response.get_json()["revision"]
+    assert new_revision != revision
+    assert response.headers["X-Entry-Revision"] == new_revision
+    assert get_journal_store().read_entry(FILENAME) == "# Monday\n\nWent for a walk."
+
+
+def test_chained_deltas(client):
+    revision = get_journal_store().revision(FILENAME)
+    for text in ("!", "!"):
+        end = len(get_journal_store().read_entry(FILENAME))
+        response = save(
+            client,
+            base_revision=revision,
+            delta={"start": end, "end": end, "text": text},
+        )
+        assert response.status_code == 200
+        revision = response.get_json()["revision"]
+    assert get_journal_store().read_entry(FILENAME).endswith("run.!!")
+
+
+def test_stale_delta_is_refused_with_409(client):
+    stale = get_journal_store().revision(FILENAME)
+    current = get_journal_store().write_entry(FILENAME, "# Monday\n\nFrom the chat.")
+
+    response = save(
+        client, base_revision=stale, delta={"start": 0, "end": 0, "text": "x"}
+    )
+    assert response.status_code == 409
+    assert response.get_json()["revision"] == current
+    assert get_journal_store().read_entry(FILENAME) == "# Monday\n\nFrom the chat."
+
+
+def test_stale_full_save_is_refused_with_409(client):
+    stale = get_journal_store().revision(FILENAME)
+    get_journal_store().write_entry(FILENAME, "# Monday\n\nFrom the chat.")
+    response = save(client, base_revision=stale, content="# Monday\n\nMine.")
+    assert response.status_code == 409
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"delta": {"start": 0, "end": 0, "text": "x"}},
+        {"base_revision": "x", "delta": {"start": 0}},
+        {"base_revision": "x", "delta": {"start": 0, "end": 0, "text": 1}},
+        {},
+    ],
+)
+def test_malformed_saves_are_refused_with_400(client, data):
+    if data.get("base_revision"):
+        data["base_revision"] = get_journal_store().revision(FILENAME)
+    assert save(client, **data).status_code == 400
+
+
+def test_out_of_range_delta_is_refused_with_400(client):
+    revision = get_journal_store().revision(FILENAME)
+    response = save(
+        client, base_revision=revision, delta={"start": 5, "end": 500, "text": ""}
+    )
+    assert response.status_code == 400
+
+
+def test_normalized_content_is_sent_back(client):
+    response = save(client, content="# Monday\n\n\n\nWent for a run.")
+    assert response.status_code == 200
+    assert response.get_json()["content"] == "# Monday\n\nWent for a run."
+
+
+def test_unknown_entry_is_404(client):
+    response = client.post("/api/update-entry/nope.md", json={"content": "x"})
+    assert response.status_code == 404
@@ -0,0 +1,82 @@
+import datetime
+
+from calendar_store import CalendarEvent, EventStore
+
+EVENTS = [
+    {
+        "id": "late",
+        "summary": "Dinner",
+        "start": {"dateTime": "2024-01-02T19:00:00+01:00"},
+        "end": {"dateTime": "2024-01-02T21:00:00+01:00"},
+    },
+    {
+        "id": "overnight",
+        "summary": "Night train",
+        "start": {"dateTime": "2024-01-01T22:00:00-05:00"},
+        "end": {"dateTime": "2024-01-02T06:00:00-05:00"},
+    },
+    {
+        "id": "trip",
+        "summary": "Trip",
+        "start": {"date": "2024-01-03"},
+        "end": {"date": "2024-01-05"},
+    },
+    {
+        "id": "early",
+        "summary": "Standup",
+        "start": {"dateTime": "2024-01-02T09:00:00Z"},
+        "end": {"dateTime": "2024-01-02T09:15:00Z"},
+    },
+]
+
+
+def summaries(events):
+    return [event.summary for event in events]
+
+
+def day(n):
+    return datetime.date(2024, 1, n)
+
+
+def test_events_keep_their_wall_clock_time():
+    event = CalendarEvent.from_api(EVENTS[1])
+    assert event.start == datetime.datetime(2024, 1, 1, 22)
+    assert not event.all_day
+    assert CalendarEvent.from_api(EVENTS[2]).all_day
+
+
+def test_to_dict_round_trips():
+    event = CalendarEvent.from_api(EVENTS[0])
+    again = CalendarEvent.from_api(event.to_dict())
+    assert again.to_dict() == event.to_dict()
+    assert event.to_dict()["start"] == EVENTS[0]["start"]
+
+
+def test_days_treat_the_end_as_exclusive():
+    assert list(CalendarEvent.from_api(EVENTS[2]).days()) == [day(3), day(4)]
+    assert list(CalendarEvent.from_api(EVENTS[1]).days()) == [day(1), day(2)]
+
+
+def test_events_are_sorted_by_start():
+    store = EventStore.from_api(EVENTS)
+    assert len(store) == 4
+    assert summaries(store) == ["Night train", "Standup", "Dinner", "Trip"]
+
+
+def test_starting_between_and_on():
+    store = EventStore.from_api(EVENTS)
+    assert summaries(store.starting_on(day(2))) == ["Standup", "Dinner"]
+    assert summaries(store.starting_between(day(1), day(3))) == [
+        "Night train",
+        "Standup",
+        "Dinner",
+        "Trip",
+    ]
+    assert store.starting_on(day(5)) == []
+
+
+def test_events_on_include_ones_that_started_earlier():
+    store = EventStore.from_api(EVENTS)
+    assert summaries(store.events_on(day(2))) == ["Night train", "Standup", "Dinner"]
+    assert summaries(store.events_on(day(4))) == ["Trip"]
+    assert store.events_on(day(5)) == []
@@ -0,0 +1,81 @@
+import datetime
+import os
+
+import pytest
+
+import calendar_utils
+
+EVENT = {
+    "id": "standup",
+    "summary": "Standup",
+    "start": {"dateTime": "2024-01-02T09:00:00"},
+    "end": {"dateTime": "2024-01-02T09:15:00"},
+}
+
+
+class FakeReader:
+    """Counts requests to Google; every sync returns the same event."""
+
+    def __init__(self):
+        self.requests = 0
+
+    def iter_sync_pages(self, sync_token=None, start_date=None, **kwargs):
+        self.requests += 1
+        yield [EVENT], "token"
+
+
+@pytest.fixture
+def reader(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    reader = FakeReader()
+    monkeypatch.setattr(calendar_utils, "calendar_reader", reader)
+    monkeypatch.setattr(calendar_utils, "_indexed_store", None)
+    monkeypatch.setattr(
+        calendar_utils, "sync_metrics", dict.fromkeys(calendar_utils.sync_metrics, 0)
+    )
+    return reader
+
+
+START = datetime.date(2024, 1, 1)
+
+
+def test_syncs_in_quick_succession_are_rate_limited(reader):
+    assert [e.summary for e in calendar_utils.sync_calendar_events(START)] == [
+        "Standup"
+    ]
+    calendar_utils.sync_calendar_events(START)
+    assert reader.requests == 1
+    assert calendar_utils.get_sync_metrics()["rate_limited"] == 1
+
+
+def test_bypass_rate_limit_reaches_google(reader):
+    calendar_utils.sync_calendar_events(START)
+    calendar_utils.sync_calendar_events(START, bypass_rate_limit=True)
+    assert reader.requests == 2
+    assert calendar_utils.get_sync_metrics() == {
+        "fetches": 2,
+        "coalesced": 0,
+        "rate_limited": 0,
+    }
+
+
+class FixedDate(datetime.date):
+    """Today is the day of the fake event, so the cached week contains it."""
+
+    @classmethod
+    def today(cls):
+        return cls(2024, 1, 2)
+
+
+def test_reauth_refresh_bypasses_the_rate_limit(reader, monkeypatch):
+    monkeypatch.setattr(calendar_utils.datetime, "date", FixedDate)
+    calendar_utils.fetch_and_filter_calendar_events(force_refresh=True)
+    calendar_utils.fetch_and_filter_calendar_events(force_refresh=True)
+    assert reader.requests == 1
+
+    all_events, _ = calendar_utils.fetch_and_filter_calendar_events(
+        force_refresh=True, bypass_rate_limit=True
+    )
+    assert reader.requests == 2
+    assert [event.summary for event in all_events] == ["Standup"]
@@ -0,0 +1,125 @@
+import asyncio
+import datetime
+import threading
+
+import pytest
+from llama_index.core import VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import TextNode
+
+from hybrid_retriever import (
+    BM25Index,
+    HybridRetriever,
+    entry_date,
+    reciprocal_rank_fusion,
+    tokenize,
+)
+
+TEXTS = {
+    "2024-01-01-entry.md": "Coffee with Sam, then code review all afternoon.",
+    "2024-01-02-entry.md": "Went for a run in the park. The zeppelin flew over.",
+    "2024-01-03-entry.md": "Coffee again. Rain all day, stayed in and read.",
+}
+
+
+def make_nodes():
+    return {
+        filename: [TextNode(text=text, id_=filename)]
+        for filename, text in TEXTS.items()
+    }
+
+
+def test_tokenize_drops_stopwords_and_case():
+    assert tokenize("What did I do in the Park?") == ["park"]
+
+
+def test_entry_date():
+    assert entry_date("2024-01-02-entry.md") == datetime.date(2024, 1, 2)
+    assert entry_date("2024-13-02-entry.md") is None
+    assert entry_date("notes.md") is None
+
+
+def test_bm25_ranks_rare_terms_first():
+    index = BM25Index()
+    for filename, nodes in make_nodes().items():
+        index.add(filename, nodes)
+
+    assert [node_id for node_id, _ in index.search("zeppelin", 3)] == [
+        "2024-01-02-entry.md"
+    ]
+    ranked = [node_id for node_id, _ in index.search("coffee rain", 3)]
+    assert ranked[0] == "2024-01-03-entry.md"
+    assert set(ranked) == {"2024-01-01-entry.md", "2024-01-03-entry.md"}
+
+
+def test_bm25_add_replaces_and_remove_forgets():
+    index = BM25Index()
+    index.add("a.md", [TextNode(text="zeppelin", id_="a")])
+    index.add("a.md", [TextNode(text="balloon", id_="a")])
+    assert index.search("zeppelin", 3) == []
+    index.remove("a.md")
+    assert index.search("balloon", 3) == []
+
+
+def test_bm25_search_within_node_ids():
+    index = BM25Index()
+    for filename, nodes in make_nodes().items():
+        index.add(filename, nodes)
+    results = index.search("coffee", 3, node_ids={"2024-01-01-entry.md"})
+    assert [node_id for node_id, _ in results] == ["2024-01-01-entry.md"]
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "a"]], k=1)
+    assert [node_id for node_id, _ in fused] == ["b", "a", "c"]
+
+
+@pytest.fixture
+def retriever_parts():
+    embed_model = MockEmbedding(embed_dim=8)
+    nodes = make_nodes()
+    index = VectorStoreIndex(
+        [node for file_nodes in nodes.values() for node in file_nodes],
+        embed_model=embed_model,
+    )
+    keyword_index = BM25Index()
+    for filename, file_nodes in nodes.items():
+        keyword_index.add(filename, file_nodes)
+    return index, keyword_index, embed_model
+
+
+def test_hybrid_retriever_puts_keyword_match_first(retriever_parts):
+    retriever = HybridRetriever(*retriever_parts, top_k=2, candidate_k=3)
+    results = retriever.retrieve("zeppelin")
+    assert len(results) == 2
+    assert results[0].node.node_id == "2024-01-02-entry.md"
+
+    async_results = asyncio.run(retriever.aretrieve("zeppelin"))
+    assert [r.node.node_id for r in async_results] == [r.node.node_id for r in results]
+
+
+def test_hybrid_retriever_respects_node_ids(retriever_parts):
+    retriever = HybridRetriever(
+        *retriever_parts, top_k=3, candidate_k=3, node_ids=["2024-01-03-entry.md"]
+    )
+    assert [r.node.node_id for r in retriever.retrieve("coffee")] == [
+        "2024-01-03-entry.md"
+    ]
+    empty = HybridRetriever(*retriever_parts, top_k=3, candidate_k=3, node_ids=[])
+    assert empty.retrieve("coffee") == []
+
+
+def test_hybrid_retriever_searches_under_the_lock(retriever_parts):
+    lock = threading.Lock()
+    retriever = HybridRetriever(*retriever_parts, top_k=2, candidate_k=3, lock=lock)
+    results = []
+
+    with lock:
+        thread = threading.Thread(
+            target=lambda: results.extend(retriever.retrieve("coffee"))
+        )
+        thread.start()
+        thread.join(0.2)
+        assert thread.is_alive()
+    thread.join()
+    assert results
@@ -0,0 +1,83 @@
+import pytest
+
+from journal_edits import EditError, apply_edits, parse_edits, split_sections
+
+ENTRY = "# Monday\n\nWent for a run.\n\n## Work\n\nLong meeting.\n\n## Evening\n\nRead a book.\n"
+
+
+def test_split_sections_round_trips():
+    sections = split_sections(ENTRY)
+    assert len(sections) == 3
+    assert "".join(sections) == ENTRY
+
+
+def test_split_sections_ignores_headings_in_code_fences():
+    text = "# Notes\n\n```\n# not a heading\n```\n\n## Later\n\nDone.\n"
+    sections = split_sections(text)
+    assert len(sections) == 2
+    assert "# not a heading" in sections[0]
+
+
+def test_parse_edits_accepts_object_list_and_fence():
+    edit = {"op": "replace", "section": 1, "text": "# Tuesday"}
+    assert parse_edits(
+        '{"edits": [{"op": "replace", "section": 1, "text": "# Tuesday"}]}'
+    ) == [edit]
+    assert parse_edits('[{"op": "replace", "section": 1, "text": "# Tuesday"}]') == [
+        edit
+    ]
+    assert parse_edits(
+        '```json\n{"edits": [{"op": "replace", "section": 1, "text": "# Tuesday"}]}\n```'
+    ) == [edit]
+
+
+@pytest.mark.parametrize(
+    "response",
+    [
+        "not json",
+        '{"edits": "nope"}',
+        '[{"op": "delete", "section": 1, "text": ""}]',
+        '[{"op": "replace", "section": 1}]',
+    ],
+)
+def test_parse_edits_rejects_malformed_edits(response):
+    with pytest.raises(EditError):
+        parse_edits(response)
+
+
+def test_replace_keeps_other_sections_byte_for_byte():
+    updated = apply_edits(
+        ENTRY, [{"op": "replace", "section": 2, "text": "## Work\n\nShort meeting."}]
+    )
+    assert updated == (
+        "# Monday\n\nWent for a run.\n\n## Work\n\nShort meeting.\n\n"
+        "## Evening\n\nRead a book."
+    )
+
+
+def test_insert_and_append_section():
+    updated = apply_edits(
+        ENTRY,
+        [
+            {"op": "insert", "section": "1", "text": "Felt great."},
+            {"op": "append_section", "text": "## Gratitude\n\nSunshine."},
+        ],
+    )
+    assert updated.startswith("# Monday\n\nWent for a run.\n\nFelt great.\n\n## Work")
+    assert updated.endswith("Read a book.\n\n## Gratitude\n\nSunshine.")
+
+
+def test_section_numbers_refer_to_the_original_entry():
+    updated = apply_edits(
+        ENTRY,
+        [
+            {"op": "replace", "section": 1, "text": ""},
+            {"op": "replace", "section": 3, "text": "## Evening\n\nWatched a film."},
+        ],
+    )
+    assert updated == "## Work\n\nLong meeting.\n\n## Evening\n\nWatched a film."
+
+
+def test_unknown_section_raises():
+    with pytest.raises(EditError):
+        apply_edits(ENTRY, [{"op": "replace", "section": 4, "text": "x"}])
@@ -0,0 +1,134 @@
+import os
+
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+
+import journal_index
+from journal_store import get_journal_store
+
+FILENAME = "2024-01-01-entry.md"
+
+
+@pytest.fixture
+def index_state(journal_dir, monkeypatch):
+    """No index loaded yet, and a record of the index's saves."""
+    for name in ("_index", "_manifest", "_keyword_index", "_indexer_thread"):
+        monkeypatch.setattr(journal_index, name, None)
+    monkeypatch.setattr(journal_index, "_pending", {})
+
+    saves = []
+    save = journal_index._save
+    monkeypatch.setattr(
+        journal_index,
+        "_save",
+        lambda index, manifest, content_changed: (
+            saves.append(content_changed),
+            save(index, manifest, content_changed),
+        ),
+    )
+    invalidations = []
+    monkeypatch.setattr(
+        journal_index, "invalidate_responses", lambda tool: invalidations.append(tool)
+    )
+    return saves, invalidations
+
+
+@pytest.fixture
+def embed_model():
+    return MockEmbedding(embed_dim=8)
+
+
+def search(embed_model, query):
+    retriever = journal_index.get_journal_retriever(embed_model)
+    return [result.node.ref_doc_id for result in retriever.retrieve(query)]
+
+
+def test_changed_text_is_reindexed(index_state, embed_model):
+    saves, invalidations = index_state
+    store = get_journal_store()
+    revision = store.create_entry(FILENAME, "# Monday\n\nCoffee with Sam.")
+    assert search(embed_model, "coffee") == [FILENAME]
+
+    store.write_entry(FILENAME, "# Monday\n\nA zeppelin flew over.", revision)
+    assert search(embed_model, "zeppelin") == [FILENAME]
+    assert saves == [True, True]
+    assert invalidations == ["journal_search", "journal_search"]
+
+
+def test_version_only_changes_save_just_the_manifest(index_state, embed_model):
+    saves, invalidations = index_state
+    store = get_journal_store()
+    store.create_entry(FILENAME, "# Monday\n\nCoffee with Sam.")
+    search(embed_model, "coffee")
+
+    # Compaction moves the text into the .md file, changing only its version
+    store.journal_log.compact()
+    assert search(embed_model, "coffee") == [FILENAME]
+    assert saves == [True, False]
+    assert invalidations == ["journal_search"]
+    assert journal_index._load_manifest() == journal_index._manifest
+
+
+def test_deleted_entries_are_dropped(index_state, embed_model):
+    store = get_journal_store()
+    store.create_entry(FILENAME, "# Monday\n\nCoffee with Sam.")
+    store.journal_log.compact()
+    search(embed_model, "coffee")
+
+    os.remove(os.path.join("data", FILENAME))
+    assert search(embed_model, "coffee") == []
+    assert FILENAME not in journal_index._manifest["entries"]
+
+
+# What the indexer's embedding model saw: whether the index lock was held
+# for each call, and whether to fail as if the embedder were unreachable
+embedder = {"locked": [], "fail": False}
+
+
+class RecordingEmbedding(MockEmbedding):
+    def _get_text_embeddings(self, texts):
+        if embedder["fail"]:
+            raise ConnectionError("embedder unreachable")
+        embedder["locked"].append(journal_index._lock.locked())
+        return super()._get_text_embeddings(texts)
+
+
+@pytest.fixture
+def indexer_model(index_state, monkeypatch):
+    """The background indexer's embedding model, without starting its threads."""
+    embed_model = RecordingEmbedding(embed_dim=8)
+    monkeypatch.setitem(embedder, "locked", [])
+    monkeypatch.setitem(embedder, "fail", False)
+    monkeypatch.setattr(journal_index, "_embed_model", embed_model)
+    monkeypatch.setattr(journal_index, "_indexer_thread", object())
+    return embed_model
+
+
+def test_indexer_embeds_without_the_lock(indexer_model):
+    get_journal_store().create_entry(FILENAME, "# Monday\n\nCoffee with Sam.")
+    journal_index._update_entries(journal_index._changed_entries())
+
+    assert embedder["locked"] == [False]
+    assert search(indexer_model, "coffee") == [FILENAME]
+    assert journal_index._load_manifest()["entries"][FILENAME]
+
+
+def test_searches_never_embed_once_the_indexer_runs(indexer_model):
+    get_journal_store().create_entry(FILENAME, "# Monday\n\nCoffee with Sam.")
+    assert search(indexer_model, "coffee") == []
+    assert journal_index._changed_entries() == [FILENAME]
+
+
+def test_failed_updates_are_retried(indexer_model):
+    get_journal_store().create_entry(FILENAME, "# Monday\n\nCoffee with Sam.")
+    embedder["fail"] = True
+    with pytest.raises(ConnectionError):
+        journal_index._update_entries([FILENAME])
+    journal_index._schedule_retry([FILENAME])
+
+    assert FILENAME in journal_index._pending
+    assert FILENAME not in journal_index._manifest["entries"]
+
+    embedder["fail"] = False
+    journal_index._update_entries([FILENAME])
+    assert search(indexer_model, "coffee") == [FILENAME]
@@ -0,0 +1,143 @@
+import os
+import threading
+
+import pytest
+
+from journal_log import JournalLog, RevisionConflict, revision_of
+
+FILENAME = "2024-01-01-entry.md"
+
+
+@pytest.fixture
+def log(journal_dir):
+    return JournalLog(str(journal_dir))
+
+
+def test_create_read_and_revision(log):
+    revision = log.create_entry(FILENAME, "# Monday\n\n")
+    assert revision == revision_of("# Monday\n\n")
+    assert log.read_entry_with_revision(FILENAME) == ("# Monday\n\n", revision)
+    assert log.revision(FILENAME) == revision
+    assert log.exists(FILENAME)
+    assert not log.exists("2024-01-02-entry.md")
+    # Nothing reaches the .md file before compaction
+    assert not os.path.exists(os.path.join(log.journal_dir, FILENAME))
+
+    with pytest.raises(FileExistsError):
+        log.create_entry(FILENAME, "again")
+    with pytest.raises(FileNotFoundError):
+        log.read_entry("2024-01-02-entry.md")
+
+
+def test_existing_md_files_are_read_through(log):
+    with open(os.path.join(log.journal_dir, FILENAME), "w") as f:
+        f.write("# From disk")
+    assert log.read_entry(FILENAME) == "# From disk"
+    assert log.revision(FILENAME) == revision_of("# From disk")
+    assert log.exists(FILENAME)
+    assert log.pending() == {}
+
+
+def test_small_edits_are_logged_as_deltas(log):
+    base = log.create_entry(FILENAME, "# Monday\n\n" + "Went for a run. " * 20)
+    log.write_entry(FILENAME, "# Tuesday\n\n" + "Went for a run. " * 20, base)
+    record = log.history(FILENAME)[-1]
+    assert "content" not in record
+    assert (record["start"], record["end"], record["text"]) == (2, 5, "Tues")
+    assert record["base"] == base
+
+
+def test_unchanged_writes_log_nothing(log):
+    revision = log.create_entry(FILENAME, "# Monday")
+    assert log.write_entry(FILENAME, "# Monday", revision) == revision
+    assert len(log.history(FILENAME)) == 1
+
+
+def test_stale_writes_raise_revision_conflict(log):
+    base = log.create_entry(FILENAME, "# Monday")
+    current = log.write_entry(FILENAME, "# Monday\n\nFrom the editor.", base)
+
+    with pytest.raises(RevisionConflict) as conflict:
+        log.write_entry(FILENAME, "# Monday\n\nFrom the chat.", base)
+    assert conflict.value.revision == current
+    with pytest.raises(RevisionConflict):
+        log.apply_delta(FILENAME, 0, 0, "x", base)
+    assert log.read_entry(FILENAME) == "# Monday\n\nFrom the editor."
+
+
+def test_apply_delta(log):
+    base = log.create_entry(FILENAME, "# Monday")
+    text, revision = log.apply_delta(FILENAME, 2, 8, "Tuesday", base)
+    assert text == "# Tuesday"
+    assert revision == revision_of(text)
+    with pytest.raises(ValueError):
+        log.apply_delta(FILENAME, 5, 50, "", revision)
+
+
+def test_other_writers_are_replayed(log):
+    other = JournalLog(log.journal_dir)
+    base = log.create_entry(FILENAME, "# Monday")
+    revision = other.write_entry(FILENAME, "# Monday\n\nFrom another process.", base)
+    assert log.read_entry_with_revision(FILENAME) == (
+        "# Monday\n\nFrom another process.",
+        revision,
+    )
+    with pytest.raises(RevisionConflict):
+        log.write_entry(FILENAME, "# Monday\n\nStale.", base)
+
+
+def test_a_new_instance_recovers_from_the_log(log):
+    base = log.create_entry(FILENAME, "# Monday")
+    log.write_entry(FILENAME, "# Monday\n\nNot compacted yet.", base)
+    recovered = JournalLog(log.journal_dir)
+    assert recovered.read_entry(FILENAME) == "# Monday\n\nNot compacted yet."
+    assert recovered.pending() == {FILENAME: log.revision(FILENAME)}
+
+
+def test_compaction_writes_entries_and_archives_the_log(log):
+    other = JournalLog(log.journal_dir)
+    base = log.create_entry(FILENAME, "# Monday")
+    revision = log.write_entry(FILENAME, "# Monday\n\nCompacted.", base)
+
+    assert log.compact() == 1
+    assert log.compact() == 0
+    with open(os.path.join(log.journal_dir, FILENAME)) as f:
+        assert f.read() == "# Monday\n\nCompacted."
+    assert log.pending() == {}
+    assert not [name for name in os.listdir(log.log_dir) if name.endswith(".log")]
+    assert len(log.history(FILENAME)) == 2
+
+    # Revisions carry over, and other instances drop their overlays too
+    assert log.revision(FILENAME) == revision
+    assert other.read_entry(FILENAME) == "# Monday\n\nCompacted."
+    assert other.pending() == {}
+    assert other.write_entry(FILENAME, "# Monday\n\nAfter.", revision)
+    assert log.read_entry(FILENAME) == "# Monday\n\nAfter."
+    assert JournalLog(log.journal_dir).read_entry(FILENAME) == "# Monday\n\nAfter."
+
+
+def test_concurrent_writers_never_lose_an_edit(log):
+    log.create_entry(FILENAME, "")
+    writers = [JournalLog(log.journal_dir) for _ in range(4)]
+
+    def append(writer, mark):
+        for _ in range(10):
+            while True:
+                text, revision = writer.read_entry_with_revision(FILENAME)
+                try:
+                    writer.apply_delta(FILENAME, len(text), len(text), mark, revision)
+                    break
+                except RevisionConflict:
+                    continue
+
+    threads = [
+        threading.Thread(target=append, args=(writer, str(i)))
+        for i, writer in enumerate(writers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    text = log.read_entry(FILENAME)
+    assert sorted(text) == sorted("0123" * 10)
@@ -0,0 +1,172 @@
+import datetime
+import os
+
+import pytest
+
+from journal_log import RevisionConflict, revision_of
+from journal_store import FlatFileStore, SQLiteStore, export_entries, import_entries
+
+ENTRIES = {
+    "2024-01-01-090000-entry.md": "# Monday\nCoffee with Sam, then a long run.",
+    "2024-01-01-210000-entry.md": "# Monday night\nRead a book about zeppelins.",
+    "2024-01-15-080000-entry.md": "# Later\nCoffee, coffee and more coffee.",
+    "2024-02-01-080000-entry.md": "# February\nRain all day.",
+}
+
+
+@pytest.fixture(params=["files", "sqlite"])
+def store(request, journal_dir):
+    if request.param == "files":
+        store = FlatFileStore()
+    else:
+        store = SQLiteStore(os.path.join("data", "journal.db"))
+    for filename, content in ENTRIES.items():
+        store.create_entry(filename, content)
+    return store
+
+
+def filenames(entries):
+    return [entry["filename"] for entry in entries]
+
+
+def test_list_entries_latest_first(store):
+    entries, cursor = store.list_entries()
+    assert filenames(entries) == sorted(ENTRIES, reverse=True)
+    assert cursor is None
+    assert entries[-1] == {
+        "date": "2024-01-01",
+        "title": "Monday",
+        "preview": "Coffee with Sam, then a long run.",
+        "filename": "2024-01-01-090000-entry.md",
+    }
+
+
+def test_list_entries_pages_with_cursors(store):
+    first, cursor = store.list_entries(limit=3)
+    assert filenames(first) == sorted(ENTRIES, reverse=True)[:3]
+    second, cursor = store.list_entries(limit=3, before=cursor)
+    assert filenames(second) == ["2024-01-01-090000-entry.md"]
+    assert cursor is None
+
+
+def test_list_entries_by_date_range(store):
+    entries, _ = store.list_entries(
+        start_date=datetime.date(2024, 1, 1), end_date=datetime.date(2024, 1, 15)
+    )
+    assert filenames(entries) == [
+        "2024-01-15-080000-entry.md",
+        "2024-01-01-210000-entry.md",
+        "2024-01-01-090000-entry.md",
+    ]
+    entries, cursor = store.list_entries(
+        limit=1,
+        start_date=datetime.date(2024, 1, 1),
+        end_date=datetime.date(2024, 1, 1),
+    )
+    assert filenames(entries) == ["2024-01-01-210000-entry.md"]
+    assert cursor == "2024-01-01-210000-entry.md"
+
+
+def test_listing_follows_writes(store):
+    store.list_entries()
+    filename = "2024-03-01-080000-entry.md"
+    revision = store.create_entry(filename, "# March\nSpring.")
+    store.write_entry(filename, "# March, renamed\nSpring.", revision)
+    entries, _ = store.list_entries(limit=1)
+    assert entries[0]["filename"] == filename
+    assert entries[0]["title"] == "March, renamed"
+
+
+def test_search_needs_every_term(store):
+    assert filenames(store.search("coffee")) == [
+        "2024-01-15-080000-entry.md",
+        "2024-01-01-090000-entry.md",
+    ]
+    assert filenames(store.search("coffee run")) == ["2024-01-01-090000-entry.md"]
+    assert store.search("coffee rain") == []
+    assert store.search("  ") == []
+
+
+def test_search_results(store):
+    [result] = store.search("zeppelins")
+    assert result["title"] == "Monday night"
+    assert result["date"] == "2024-01-01"
+    assert "zeppelins" in result["snippet"]
+
+
+def test_search_by_date_range_and_limit(store):
+    assert filenames(store.search("coffee", start_date=datetime.date(2024, 1, 2))) == [
+        "2024-01-15-080000-entry.md"
+    ]
+    assert filenames(store.search("coffee", end_date=datetime.date(2024, 1, 1))) == [
+        "2024-01-01-090000-entry.md"
+    ]
+    assert len(store.search("coffee", limit=1)) == 1
+
+
+def test_search_treats_query_syntax_as_words(store):
+    assert store.search('coffee" OR "rain') == []
+    assert filenames(store.search("RAIN!")) == ["2024-02-01-080000-entry.md"]
+
+
+def test_reads_and_revisions(store):
+    filename = "2024-02-01-080000-entry.md"
+    content = ENTRIES[filename]
+    assert store.read_entry(filename) == content
+    assert store.read_entry_with_revision(filename) == (content, revision_of(content))
+    assert store.revision(filename) == revision_of(content)
+    assert store.exists(filename)
+    assert not store.exists("2024-03-01-entry.md")
+    with pytest.raises(FileNotFoundError):
+        store.read_entry("2024-03-01-entry.md")
+    with pytest.raises(FileExistsError):
+        store.create_entry(filename, "again")
+
+
+def test_revision_conflicts(store):
+    filename = "2024-02-01-080000-entry.md"
+    stale = store.revision(filename)
+    current = store.write_entry(filename, "# February\nSnow.", stale)
+    assert current == revision_of("# February\nSnow.")
+
+    with pytest.raises(RevisionConflict) as conflict:
+        store.write_entry(filename, "# February\nSun.", stale)
+    assert conflict.value.revision == current
+    with pytest.raises(RevisionConflict):
+        store.apply_delta(filename, 0, 0, "x", stale)
+    assert store.read_entry(filename) == "# February\nSnow."
+
+    text, revision = store.apply_delta(filename, 11, 15, "Sleet", current)
+    assert text == "# February\nSleet."
+    assert store.revision(filename) == revision
+    with pytest.raises(ValueError):
+        store.apply_delta(filename, 5, 500, "", revision)
+
+
+def test_versions_change_with_the_text(store):
+    filename = "2024-02-01-080000-entry.md"
+    before = store.versions()
+    assert set(before) == set(ENTRIES)
+    store.write_entry(filename, "# February\nSnow.")
+    after = store.versions()
+    assert after[filename] != before[filename]
+    assert {f: v for f, v in after.items() if f != filename} == {
+        f: v for f, v in before.items() if f != filename
+    }
+
+
+def test_import_and_export_round_trip(journal_dir):
+    files = FlatFileStore()
+    for filename, content in ENTRIES.items():
+        files.create_entry(filename, content)
+
+    sqlite = SQLiteStore(os.path.join("data", "journal.db"))
+    assert import_entries("data", sqlite) == len(ENTRIES)
+    # Importing again replaces rows instead of failing
+    assert import_entries("data", sqlite) == len(ENTRIES)
+    assert sqlite.list_entries() == files.list_entries()
+
+    assert export_entries(sqlite, "exported") == len(ENTRIES)
+    for filename, content in ENTRIES.items():
+        with open(os.path.join("exported", filename)) as f:
+            assert f.read() == content
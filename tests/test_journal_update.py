@@ -0,0 +1,145 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from journal_edits import EditError
+from journal_log import RevisionConflict
+from journal_store import get_journal_store
+from journal_update import edit_journal_entry, stream_journal_update
+
+FILENAME = "2024-01-01-entry.md"
+ORIGINAL = "# Monday\n\nWent for a run."
+
+
+class FakeClient:
+    """Streams parts, or returns them as one message when not streaming.
+
+    before_part(i) runs before part i is sent, fail raises after the last one.
+    """
+
+    def __init__(self, parts, before_part=None, fail=False):
+        self.parts = parts
+        self.before_part = before_part
+        self.fail = fail
+        self.chat = SimpleNamespace(completions=self)
+
+    async def create(self, stream=False, **kwargs):
+        if not stream:
+            message = SimpleNamespace(content="".join(self.parts))
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+        async def chunks():
+            for i, part in enumerate(self.parts):
+                if self.before_part:
+                    self.before_part(i)
+                delta = SimpleNamespace(content=part)
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+            if self.fail:
+                raise RuntimeError("stream broke")
+
+        return chunks()
+
+
+@pytest.fixture
+def store(journal_dir):
+    store = get_journal_store()
+    store.create_entry(FILENAME, ORIGINAL)
+    return store
+
+
+def run_stream(store, client, **kwargs):
+    return asyncio.run(
+        stream_journal_update(
+            client, "model", FILENAME, "prompt", store=store, interval=0, **kwargs
+        )
+    )
+
+
+def test_stream_chains_revisions_through_partial_writes(store):
+    progress = []
+
+    async def on_progress(text, done):
+        progress.append(done)
+
+    updated = run_stream(
+        store,
+        FakeClient(["# Monday\n\n", "Went for ", "a walk."]),
+        on_progress=on_progress,
+        base_revision=store.revision(FILENAME),
+    )
+    assert updated == "# Monday\n\nWent for a walk."
+    assert store.read_entry(FILENAME) == updated
+    assert progress[-1] is True and progress.count(True) == 1
+
+
+def test_stream_refuses_a_stale_base_revision(store):
+    stale = store.revision(FILENAME)
+    store.write_entry(FILENAME, "# Monday\n\nFrom the editor.")
+    with pytest.raises(RevisionConflict):
+        run_stream(store, FakeClient(["# Monday"]), base_revision=stale)
+    assert store.read_entry(FILENAME) == "# Monday\n\nFrom the editor."
+
+
+def test_stream_stops_when_edited_meanwhile(store):
+    def edit_in_editor(i):
+        if i == 2:
+            store.write_entry(FILENAME, "# Monday\n\nFrom the editor.")
+
+    with pytest.raises(RevisionConflict):
+        run_stream(store, FakeClient(["# Mon", "day", "\n\nNew."], edit_in_editor))
+    assert store.read_entry(FILENAME) == "# Monday\n\nFrom the editor."
+
+
+def test_stream_restores_the_original_on_failure(store):
+    with pytest.raises(RuntimeError):
+        run_stream(store, FakeClient(["# Half", " written"], fail=True))
+    assert store.read_entry(FILENAME) == ORIGINAL
+
+
+def test_stream_restores_the_original_when_empty(store):
+    with pytest.raises(ValueError):
+        run_stream(store, FakeClient(["  "]))
+    assert store.read_entry(FILENAME) == ORIGINAL
+
+
+def test_edits_are_written_against_the_base_revision(store):
+    edits = '{"edits": [{"op": "append_section", "text": "## Evening\\n\\nRead."}]}'
+    updated = asyncio.run(
+        edit_journal_entry(
+            FakeClient([edits]),
+            "model",
+            FILENAME,
+            "prompt",
+            store=store,
+            base_revision=store.revision(FILENAME),
+        )
+    )
+    assert updated == ORIGINAL + "\n\n## Evening\n\nRead."
+    assert store.read_entry(FILENAME) == updated
+
+
+def test_edits_refuse_a_stale_base_revision(store):
+    stale = store.revision(FILENAME)
+    store.write_entry(FILENAME, "# Monday\n\nFrom the editor.")
+    with pytest.raises(RevisionConflict):
+        asyncio.run(
+            edit_journal_entry(
+                FakeClient(["[]"]),
+                "model",
+                FILENAME,
+                "prompt",
+                store=store,
+                base_revision=stale,
+            )
+        )
+
+
+def test_unusable_edits_leave_the_entry_alone(store):
+    with pytest.raises(EditError):
+        asyncio.run(
+            edit_journal_entry(
+                FakeClient(["not json"]), "model", FILENAME, "prompt", store=store
+            )
+        )
+    assert store.read_entry(FILENAME) == ORIGINAL
@@ -0,0 +1,105 @@
+import asyncio
+
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, normalize_query
+
+TTLS = {"journal_search": 60, "get_top_news": 60}
+
+
+def test_normalize_query():
+    assert (
+        normalize_query("  What did I do   LAST week?? ") == "what did i do last week"
+    )
+
+
+def test_hit_after_store():
+    cache = ResponseCache(TTLS)
+    generation = cache.generation("journal_search")
+    assert cache.lookup("journal_search", "run", None) == (False, None)
+    cache.store("journal_search", "run", "result", generation)
+    assert cache.lookup("journal_search", "run", None) == (True, "result")
+    assert cache.stats()["journal_search"] == {
+        "hits": 1,
+        "misses": 1,
+        "hit_rate": 0.5,
+    }
+
+
+def test_tools_are_cached_separately():
+    cache = ResponseCache(TTLS)
+    cache.store("journal_search", "run", "journal", 0)
+    assert cache.lookup("get_top_news", "run", None) == (False, None)
+
+
+def test_invalidate_drops_results_and_refuses_stale_ones():
+    cache = ResponseCache(TTLS)
+    generation = cache.generation("journal_search")
+    cache.store("journal_search", "run", "old", generation)
+    cache.invalidate("journal_search")
+    assert cache.lookup("journal_search", "run", None) == (False, None)
+
+    # Computed from the index before it changed, so it isn't kept
+    cache.store("journal_search", "run", "stale", generation)
+    assert cache.lookup("journal_search", "run", None) == (False, None)
+
+
+def test_expired_results_are_misses(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(TTLS)
+    cache.store("journal_search", "run", "result", 0)
+    now[0] += 61
+    assert cache.lookup("journal_search", "run", None) == (False, None)
+
+
+def test_oldest_entries_are_evicted():
+    cache = ResponseCache(TTLS, max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.store("journal_search", key, key, 0)
+    assert cache.lookup("journal_search", "a", None) == (False, None)
+    assert cache.lookup("journal_search", "c", None) == (True, "c")
+
+
+def test_similar_queries_hit_above_the_threshold():
+    cache = ResponseCache(TTLS, similarity_threshold=0.9)
+    cache.store("journal_search", "morning run", "result", 0, [1.0, 0.0])
+    assert cache.lookup("journal_search", "run this morning", [0.99, 0.1]) == (
+        True,
+        "result",
+    )
+    assert cache.lookup("journal_search", "dinner", [0.0, 1.0]) == (False, None)
+
+
+def test_cached_computes_once_and_never_caches_errors(monkeypatch):
+    monkeypatch.setattr(response_cache, "response_cache", ResponseCache(TTLS))
+    monkeypatch.setattr(
+        response_cache.langfuse_context,
+        "update_current_observation",
+        lambda **kwargs: None,
+    )
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return "result"
+
+    async def fail():
+        raise RuntimeError("down")
+
+    assert (
+        asyncio.run(response_cache.cached("journal_search", "Run?", compute))
+        == "result"
+    )
+    assert (
+        asyncio.run(response_cache.cached("journal_search", "run", compute)) == "result"
+    )
+    assert len(calls) == 1
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(response_cache.cached("get_top_news", "today", fail))
+    assert response_cache.response_cache.lookup("get_top_news", "today") == (
+        False,
+        None,
+    )